@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Encoding and decoding benchmark, run with `python -m benchmarks.bench_codec`"""
+
+import logging
+import timeit
+
+from skyworth.ac_controller import AirConditionerController, Query, decode_state
+
+NUMBER = 100000
+
+REPLY = bytes.fromhex('7a7ad521190000a201021805001909008400000000000093d4')
+
+
+def run(number: int = NUMBER) -> dict:
+    logging.getLogger('skyworth').setLevel(logging.WARNING)
+    controller = AirConditionerController('127.0.0.1', transport=object())
+    controller._parse_info(REPLY)
+    data = controller.data
+    payload = data.payload
+
+    def mutate():
+        data.d1 ^= 1
+
+    def set_field():
+        controller._set_temperature_set(controller._get_temperature_set() ^ 1)
+
+    def decode_after_change():
+        data.d5 ^= 1
+        return controller._get_state()
+
+    cases = {
+        'build_frame_get_info': lambda: controller._build_frame(Query.TYPE_GET_INFO),
+        'build_command_frame': controller._build_command_frame,
+        'parse_info': lambda: controller._parse_info(REPLY),
+        'decode_state': lambda: decode_state(payload),
+        'get_state_memoized': controller._get_state,
+        'get_state_after_change': decode_after_change,
+        'data_mutation': mutate,
+        'field_set': set_field,
+    }
+
+    results = {}
+    for name, function in cases.items():
+        elapsed = min(timeit.repeat(function, number=number, repeat=5))
+        results[name] = elapsed / number * 1e9
+    return results
+
+
+if __name__ == "__main__":
+    for name, ns in run().items():
+        print('%-24s %8.1f ns/call' % (name, ns))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""CRC micro-benchmark, run with `python -m benchmarks.bench_crc`"""
+
+import timeit
+
+from skyworth import crc
+from skyworth.ac_controller import Query, frame_header
+
+try:
+    from crcmod.predefined import mkPredefinedCrcFun
+except ImportError:
+    mkPredefinedCrcFun = None
+
+NUMBER = 100000
+
+PAYLOAD = [0, 0, 0x19, 0x09, 0x00, 0x84, 0, 0, 0, 0, 0, 0]
+HEADER, HEADER_CRC = frame_header(Query.TYPE_COMMAND, 24)
+FRAME = list(HEADER) + PAYLOAD
+
+
+def run(number: int = NUMBER) -> dict:
+    cases = {}
+    if mkPredefinedCrcFun is not None:
+        # Former path: crcmod over a bytearray copy of the whole list
+        modbus_crc = mkPredefinedCrcFun('modbus')
+        cases['crcmod_list_copy'] = lambda: modbus_crc(bytearray(FRAME))
+
+    frame = bytes(FRAME)
+    payload = bytes(PAYLOAD)
+    view = memoryview(frame)
+    cases['python_table'] = lambda: crc._py_crc16_modbus(frame)
+    cases['python_table_cached_header'] = \
+        lambda: crc._py_crc16_modbus(payload, HEADER_CRC)
+    if crc._ext_crc16r is not None:
+        cases['extension'] = lambda: crc._ext_crc16_modbus(frame)
+        cases['extension_memoryview'] = lambda: crc._ext_crc16_modbus(view)
+        cases['extension_cached_header'] = \
+            lambda: crc._ext_crc16_modbus(payload, HEADER_CRC)
+
+    results = {}
+    for name, function in cases.items():
+        elapsed = min(timeit.repeat(function, number=number, repeat=5))
+        results[name] = elapsed / number * 1e9
+    return results
+
+
+if __name__ == "__main__":
+    for name, ns in run().items():
+        print('%-28s %8.1f ns/frame' % (name, ns))
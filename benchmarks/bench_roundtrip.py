@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Model round trips against the local simulator
+
+Run with `python -m benchmarks.bench_roundtrip`. Every setter call sends a
+command and waits for the reply of a simulated unit on the loopback.
+"""
+
+import logging
+import statistics
+import time
+
+from skyworth.ac_async import (
+    AsyncAirConditionerController,
+    AsyncAirConditionerModel,
+    run_sync,
+)
+from skyworth.ac_controller import AirConditionerController
+from skyworth.ac_model import AirConditionerModel
+from skyworth.connection import ConnectionPool
+from skyworth.simulator import Simulator
+
+NUMBER = 2000
+
+
+def _summary(name: str, samples: list, results: dict):
+    samples.sort()
+    results[name] = statistics.median(samples)
+    results[name + '_p95'] = samples[int(len(samples) * 0.95) - 1]
+
+
+def _measure(function, number: int) -> list:
+    samples = []
+    clock = time.perf_counter_ns
+    for index in range(number):
+        start = clock()
+        function(index)
+        samples.append(clock() - start)
+    return samples
+
+
+async def _measure_async(function, number: int) -> list:
+    samples = []
+    clock = time.perf_counter_ns
+    for index in range(number):
+        start = clock()
+        await function(index)
+        samples.append(clock() - start)
+    return samples
+
+
+def run(number: int = NUMBER) -> dict:
+    logging.getLogger('skyworth').setLevel(logging.WARNING)
+    simulator = Simulator().start_in_thread()
+    host, port = simulator.addresses[0]
+    results = {}
+    try:
+        pool = ConnectionPool()
+        model = AirConditionerModel(
+            AirConditionerController(host, port, transport=pool), ttl=0
+        )
+        model.update_state()
+        # Setters trust a fresh cache, one command per call
+        writer = AirConditionerModel(
+            AirConditionerController(host, port, transport=pool), ttl=3600
+        )
+
+        def update_state(index):
+            model.update_state()
+
+        def set_temperature(index):
+            writer.temperature_set = 20 + index % 2
+
+        _summary('sync_update_state', _measure(update_state, number), results)
+        _summary('sync_setter', _measure(set_temperature, number), results)
+        pool.close()
+
+        async def run_async():
+            controller = AsyncAirConditionerController(host, port)
+            model = AsyncAirConditionerModel(controller, ttl=0)
+            await model.update_state()
+            writer = AsyncAirConditionerModel(
+                AsyncAirConditionerController(host, port), ttl=3600
+            )
+
+            async def update_state(index):
+                await model.update_state()
+
+            async def set_temperature(index):
+                await writer.set_temperature_set(20 + index % 2)
+
+            _summary('async_update_state',
+                     await _measure_async(update_state, number), results)
+            _summary('async_setter',
+                     await _measure_async(set_temperature, number), results)
+            await controller.close()
+            await writer.controller.close()
+
+        run_sync(run_async())
+    finally:
+        simulator.stop()
+    return results
+
+
+if __name__ == "__main__":
+    for name, ns in run().items():
+        print('%-24s %10.1f ns/call' % (name, ns))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tracing overhead benchmark, run with `python -m benchmarks.bench_trace`"""
+
+import logging
+import timeit
+
+from skyworth import trace
+from skyworth.ac_controller import AirConditionerController, Query
+from skyworth.ac_model import AirConditionerModel
+
+NUMBER = 100000
+
+REPLY = bytes.fromhex('7a7ad521190000a201021805001909008400000000000093d4')
+
+
+class NullTransport:
+    def exchange(self, address, message, phases: dict = None) -> bytes:
+        return REPLY
+
+
+def null_sink(direction, address, frame):
+    pass
+
+
+def run(number: int = NUMBER) -> dict:
+    logging.getLogger('skyworth').setLevel(logging.WARNING)
+    transport = NullTransport()
+    controller = AirConditionerController('127.0.0.1', transport=transport)
+    model = AirConditionerModel(controller, ttl=3600)
+    model.update_state()
+    frame = controller._build_frame(Query.TYPE_GET_INFO)
+
+    def mutate():
+        controller.data.d1 ^= 1
+
+    cases = {
+        'exchange_only': lambda: transport.exchange(('127.0.0.1', 1998), frame),
+        'raw_send_tracing_off': lambda: controller._raw_send(frame),
+        'get_info_timing_off': controller._run_get_info,
+        'data_mutation_debug_off': mutate,
+        'model_getter_debug_off': lambda: model.power,
+        'update_state_cached_info_off': model.update_state,
+    }
+
+    results = {}
+    for name, function in cases.items():
+        elapsed = min(timeit.repeat(function, number=number, repeat=5))
+        results[name] = elapsed / number * 1e9
+
+    controller.enable_timing()
+    try:
+        for name, function in (
+            ('raw_send_timing_on', lambda: controller._raw_send(frame)),
+            ('get_info_timing_on', controller._run_get_info),
+        ):
+            elapsed = min(timeit.repeat(function, number=number, repeat=5))
+            results[name] = elapsed / number * 1e9
+    finally:
+        controller.disable_timing()
+
+    sink = trace.add_sink(trace.LoggingSink(logging.getLogger('bench'), logging.WARNING))
+    logging.getLogger('bench').addHandler(logging.NullHandler())
+    logging.getLogger('bench').propagate = False
+    try:
+        elapsed = min(timeit.repeat(
+            lambda: controller._raw_send(frame), number=number // 10, repeat=5
+        ))
+        results['raw_send_logging_sink'] = elapsed / (number // 10) * 1e9
+    finally:
+        trace.remove_sink(sink)
+    return results
+
+
+if __name__ == "__main__":
+    for name, ns in run().items():
+        print('%-30s %8.1f ns/call' % (name, ns))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the benchmark suite and write machine-readable results
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 0.2
+
+Every benchmark module exposes `run(number) -> {case: ns per call}`. With
+--baseline, cases slower than the baseline by more than the threshold are
+reported and the exit status is 1.
+"""
+
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+
+BENCHMARKS = (
+    'bench_crc',
+    'bench_codec',
+    'bench_trace',
+    'bench_roundtrip',
+)
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=BENCHMARKS, scale: float = 1.0) -> dict:
+    results = {}
+    for name in names:
+        module = importlib.import_module('benchmarks.' + name)
+        number = max(1, int(module.NUMBER * scale))
+        results[name] = {
+            case: round(ns, 1) for case, ns in module.run(number).items()
+        }
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'unit': 'ns/call',
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Return (benchmark, case, baseline, current) of the regressions"""
+    regressions = []
+    for name, cases in report['results'].items():
+        for case, ns in cases.items():
+            reference = baseline['results'].get(name, {}).get(case)
+            if reference and ns > reference * (1 + threshold):
+                regressions.append((name, case, reference, ns))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run the skyworth benchmarks')
+    parser.add_argument('names', nargs='*', default=BENCHMARKS,
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--output', help='write the JSON report to a file')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the iteration counts')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown ratio (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    report = run(args.names, args.scale)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, case, reference, ns in regressions:
+            print('%s.%s: %.1f -> %.1f ns/call (%+.0f%%)' % (
+                name, case, reference, ns, (ns / reference - 1) * 100
+            ), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Puts the repository root on sys.path so pytest imports skyworth
@@ -12,6 +12,7 @@ from time import sleep
 import skyworth.ac_controller
 import skyworth.ac_model
 import skyworth.ac_data
+import skyworth.trace
 
 from skyworth import AirConditioner
 from skyworth.ac_model import (
@@ -68,6 +69,8 @@ enabled_logging(skyworth.ac_controller._logger)
 enabled_logging(skyworth.ac_model._logger)
 # Enable logger for ac_data
 enabled_logging(skyworth.ac_data._logger)
+# Dump frames exchanged by ac_controller
+skyworth.trace.add_sink(skyworth.trace.LoggingSink(skyworth.ac_controller._logger))
 
 ac = None
 
@@ -91,6 +94,11 @@ def set_property(prop, value):
     prop = value
 
 
+def force_update():
+    ac.model.refresh(force=True)
+    rebuild_menu()
+
+
 def rebuild_menu(advanced_menu=False):
     ac.model.update_state()
 
@@ -104,7 +112,7 @@ def rebuild_menu(advanced_menu=False):
             '1':
                 (
                     "Update state",
-                    lambda: rebuild_menu(),
+                    lambda: force_update(),
                     0,
                     '',
                     '-------------------------------',
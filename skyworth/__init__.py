@@ -9,9 +9,30 @@ from . import convert
 
 from .ac_controller import AirConditionerController
 from .ac_model import AirConditionerModel
+from .ac_async import (
+    AsyncAirConditionerController,
+    AsyncAirConditionerModel,
+    SyncAirConditionerController,
+)
+from .fleet import AirConditionerFleet
 
 
 class AirConditioner:
-    def __init__(self, host: str, port: int = 1998) -> None:
-        self.controller = AirConditionerController(host, port)
+    def __init__(
+        self,
+        host: str,
+        port: int = 1998,
+        use_async_core: bool = False,
+    ) -> None:
+        if use_async_core:
+            # Blocking API served by the shared asyncio loop
+            self.controller = SyncAirConditionerController(host, port)
+        else:
+            self.controller = AirConditionerController(host, port)
         self.model = AirConditionerModel(self.controller)
+
+
+class AsyncAirConditioner:
+    def __init__(self, host: str, port: int = 1998) -> None:
+        self.controller = AsyncAirConditionerController(host, port)
+        self.model = AsyncAirConditionerModel(self.controller)
@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from pprint import pformat
+
+from .ac_controller import AirConditionerController, Query
+from .ac_model import (
+    AirConditionerModelBase,
+    ControlAction,
+    ModeAction,
+    SpeedAction,
+    SwingAction,
+    TemperatureMode,
+    WRITE_TTL,
+)
+from .cache import CacheStatus
+from .connection import PeerClosedError
+from .framing import BUFFER_SIZE, MAX_FRAME_LENGTH, FrameDecoder
+from . import metrics, trace
+from .timing import add_phase
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncAirConditionerController(AirConditionerController):
+    """AirConditionerController running its exchanges on asyncio streams
+
+    Field accessors are inherited unchanged, only `_run_command`,
+    `_run_get_info`, `_send` and `_raw_send` become coroutines.
+    One stream is kept open per controller and exchanges are serialized.
+    Frames longer than max_length are discarded, see FrameDecoder.
+    """
+
+    def __init__(self, host: str, port: int = 1998, timeout: float = 10.0,
+                 max_length: int = MAX_FRAME_LENGTH) -> None:
+        super().__init__(host, port)
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._decoder = FrameDecoder(max_length=max_length)
+        self._lock = None
+
+    def _make_transport(self):
+        # Exchanges go through the controller stream, not a pool
+        return None
+
+    @property
+    def pool_stats(self):
+        return None
+
+    async def _run_command(self, force: bool = False) -> bool:
+        _logger.info('_run_command')
+        if not force and not self.data.is_dirty():
+            _logger.debug('Data unchanged since last exchange, command skipped')
+            return False
+        if metrics.REGISTRY is not None:
+            metrics.REGISTRY.device((self.host, self.port)).commands += 1
+        if self.timing is None:
+            reply = await self._raw_send(self._build_command_frame())
+            return self._parse_command_reply(reply)
+        phases = {}
+        start = time.monotonic_ns()
+        try:
+            frame = self._build_command_frame()
+            add_phase(phases, 'encode', start)
+            reply = await self._raw_send(frame, phases)
+            decode = time.monotonic_ns()
+            result = self._parse_command_reply(reply)
+            add_phase(phases, 'decode', decode)
+        finally:
+            self._emit_timing('command', phases, start)
+        return result
+
+    async def _run_get_info(self):
+        _logger.info('_run_get_info')
+        if metrics.REGISTRY is not None:
+            metrics.REGISTRY.device((self.host, self.port)).infos += 1
+        if self.timing is None:
+            data = await self._send(Query.TYPE_GET_INFO)
+            return self._parse_info(data)
+        phases = {}
+        start = time.monotonic_ns()
+        try:
+            data = await self._send(Query.TYPE_GET_INFO, phases=phases)
+            decode = time.monotonic_ns()
+            result = self._parse_info(data)
+            add_phase(phases, 'decode', decode)
+        finally:
+            self._emit_timing('get_info', phases, start)
+        return result
+
+    async def _send(self, type: Query, data=b'', phases: dict = None) -> bytes:
+        if phases is None:
+            return await self._raw_send(self._build_frame(type, data))
+        start = time.monotonic_ns()
+        frame = self._build_frame(type, data)
+        add_phase(phases, 'encode', start)
+        return await self._raw_send(frame, phases)
+
+    async def _connect(self, phases: dict = None):
+        start = time.monotonic_ns()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if phases is not None:
+            add_phase(phases, 'connect', start)
+        self._decoder.clear()
+
+    async def _transfer(self, message: bytearray, phases: dict = None) -> bytes:
+        self._decoder.clear()
+        if phases is None:
+            self._writer.write(message)
+            await self._writer.drain()
+            return await self._receive()
+        start = time.monotonic_ns()
+        self._writer.write(message)
+        await self._writer.drain()
+        sent = add_phase(phases, 'send', start)
+        data = await self._receive()
+        add_phase(phases, 'recv', sent)
+        return data
+
+    async def _receive(self) -> bytes:
+        decoder = self._decoder
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                return bytes(frame)
+            data = await asyncio.wait_for(
+                self._reader.read(BUFFER_SIZE), self.timeout
+            )
+            if not data:
+                raise PeerClosedError('Connection closed by peer')
+            decoder.feed(data)
+
+    async def _raw_send(self, message, phases: dict = None) -> bytes:
+        if isinstance(message, (bytes, bytearray)):
+            raw_message = message
+        else:
+            raw_message = bytearray(message)
+        if trace.SINKS:
+            trace.trace_frame(trace.SEND, (self.host, self.port), raw_message)
+
+        registry = metrics.REGISTRY
+        own = phases is None and self.timing is not None
+        if phases is None and (own or registry is not None):
+            phases = {}
+        begin = time.monotonic_ns()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        try:
+            async with self._lock:
+                timestamp = time.time_ns()
+                start = time.monotonic_ns()
+                try:
+                    raw_data = await self._exchange(raw_message, phases)
+                finally:
+                    if phases is not None:
+                        add_phase(phases, 'exchange', start)
+        finally:
+            if registry is not None:
+                registry.device((self.host, self.port)).observe(phases)
+            if own:
+                self._emit_timing('raw_send', phases, begin)
+
+        if self.recorder is not None:
+            self.recorder.record(
+                timestamp, time.monotonic_ns() - start, raw_message, raw_data
+            )
+        if trace.SINKS:
+            trace.trace_frame(trace.RECEIVE, (self.host, self.port), raw_data)
+
+        return raw_data
+
+    async def _exchange(self, raw_message, phases: dict) -> bytes:
+        reused = self._writer is not None and not self._writer.is_closing()
+        if not reused:
+            await self._connect(phases)
+        try:
+            return await self._transfer(raw_message, phases)
+        except (PeerClosedError, ConnectionResetError, BrokenPipeError,
+                ConnectionAbortedError):
+            self._close_stream()
+            if not reused:
+                raise
+            _logger.debug('Connection to %s lost, reconnecting', self.host)
+            await self._connect(phases)
+            try:
+                return await self._transfer(raw_message, phases)
+            except PeerClosedError:
+                self._close_stream()
+                return b''
+        except BaseException:
+            self._close_stream()
+            raise
+
+    def _close_stream(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        writer = self._writer
+        self._close_stream()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class AsyncAirConditionerModel(AirConditionerModelBase):
+    """Asyncio counterpart of AirConditionerModel
+
+    Reads are the same (local) properties, writes are `set_*` coroutines
+    with the same side effects as the AirConditionerModel setters.
+    """
+
+    def __init__(
+        self,
+        controller: AsyncAirConditionerController,
+        ttl: float = 1.0,
+        stale_ttl: float = 0.0,
+        write_ttl: float = WRITE_TTL,
+    ) -> None:
+        super().__init__(controller, ttl, stale_ttl, write_ttl)
+        self._revalidation = None
+        self._write_lock = None
+        # Task running the open batch, which holds the write lock
+        self._batch_owner = None
+
+    def _get_write_lock(self) -> asyncio.Lock:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    def _in_own_batch(self) -> bool:
+        return bool(self._batch_depth) and \
+            self._batch_owner is asyncio.current_task()
+
+    async def _fetch(self):
+        # The task of an open batch already holds the lock
+        if self._in_own_batch():
+            calls = await self._fetch_locked()
+        else:
+            async with self._get_write_lock():
+                calls = await self._fetch_locked()
+        await self._notify(calls)
+
+    async def _fetch_locked(self) -> list:
+        """Query the unit, returns the pending callbacks
+
+        Callbacks run once the write lock is released, they may write.
+        """
+        if not await self.controller._run_get_info():
+            return []
+        return self._confirm()
+
+    async def _notify(self, calls: list):
+        # Callbacks may be plain functions or coroutine functions
+        for callback, changes in calls:
+            try:
+                result = callback(self, changes)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                _logger.exception('Subscription callback %r failed', callback)
+
+    async def poll(self, interval: float = 5.0):
+        """Query the unit every interval seconds until cancelled, feeding
+        the subscriptions
+        """
+        while True:
+            try:
+                await self.refresh(force=True)
+            except Exception as e:
+                _logger.warning('Polling %s failed: %r', self.controller.host, e)
+            await asyncio.sleep(interval)
+
+    async def _revalidate(self):
+        if self._batch_depth:
+            return
+        try:
+            await self._fetch()
+        except Exception as e:
+            _logger.warning('Background refresh failed: %r', e)
+
+    async def refresh(self, force: bool = False) -> bool:
+        """See AirConditionerModel.refresh"""
+        status = CacheStatus.MISS if force else self.cache.lookup()
+        if status == CacheStatus.FRESH:
+            return False
+        if status == CacheStatus.STALE:
+            if self._revalidation is None or self._revalidation.done():
+                self._revalidation = asyncio.ensure_future(self._revalidate())
+            return False
+        await self._fetch()
+        return True
+
+    async def update_state(self):
+        _logger.info('update_state')
+        await self.refresh()
+        if _logger.isEnabledFor(logging.INFO):
+            state = self.controller._get_state()
+            _logger.info('\n%s', pformat(state))
+            data = self.controller.data.get_debug_data()
+            _logger.info('\n%s', pformat(data))
+
+    async def _write(self, apply, value):
+        """See AirConditionerModel._write"""
+        if self._in_own_batch():
+            apply(value)
+            self._batch_pending = True
+            return
+        # Keeps concurrent writers and polls from interleaving read and
+        # command, and waits for the batch of another task
+        async with self._get_write_lock():
+            calls = await self._fetch_locked() if self._needs_read() else []
+            apply(value)
+            calls += await self._send_command_locked()
+        await self._notify(calls)
+
+    async def _send_command_locked(self) -> list:
+        if not await self.controller._run_command():
+            return []
+        return self._confirm()
+
+    @asynccontextmanager
+    async def batch(self):
+        """Group set_* calls into a single command frame, see
+        AirConditionerModel.batch
+        """
+        outermost = not self._in_own_batch()
+        if outermost:
+            lock = self._get_write_lock()
+            await lock.acquire()
+        calls = []
+        try:
+            if outermost:
+                self._batch_owner = asyncio.current_task()
+                if self._needs_read():
+                    calls = await self._fetch_locked()
+            snapshot = self.controller.data.snapshot()
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                self.controller.data.restore(snapshot)
+                if not self._batch_depth:
+                    self._batch_pending = False
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_pending:
+                self._batch_pending = False
+                calls += await self._send_command_locked()
+        finally:
+            if outermost:
+                self._batch_owner = None
+                lock.release()
+            await self._notify(calls)
+
+    async def set_power(self, value: ControlAction):
+        _logger.info('power_set')
+        await self._write(self._apply_power, value)
+
+    async def set_mute(self, value: ControlAction):
+        _logger.info('mute_set')
+        await self._write(self._apply_mute, value)
+
+    async def set_swing(self, action: SwingAction):
+        _logger.info('swing_set')
+        await self._write(self._apply_swing, action)
+
+    async def set_mode(self, action: ModeAction):
+        _logger.info('mode_set')
+        await self._write(self._apply_mode, action)
+
+    async def set_temperature_set(self, value: int):
+        _logger.info('temperature_set_set')
+        await self._write(self._apply_temperature_set, value)
+
+    async def set_speed(self, speed: SpeedAction):
+        _logger.info('speed_set')
+        await self._write(self._apply_speed, speed)
+
+    async def set_sleep(self, value: ControlAction):
+        _logger.info('sleep_set')
+        await self._write(self._apply_sleep, value)
+
+    async def set_filter_pm(self, value: ControlAction):
+        _logger.info('filter_pm_set')
+        await self._write(self._apply_filter_pm, value)
+
+    async def set_energy_saving(self, value: ControlAction):
+        _logger.info('energy_saving_set')
+        await self._write(self._apply_energy_saving, value)
+
+    async def set_turbo(self, value: ControlAction):
+        _logger.info('turbo_set')
+        await self._write(self._apply_turbo, value)
+
+    async def set_light(self, value: ControlAction):
+        _logger.info('light_set')
+        await self._write(self._apply_light, value)
+
+    async def set_temperature_mode(self, value: TemperatureMode):
+        _logger.info('temperature_mode_set')
+        await self._write(self._apply_temperature_mode, value)
+
+
+_shared_loop = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop running in the shared background thread"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name='skyworth-loop',
+                daemon=True,
+            )
+            thread.start()
+            _shared_loop = loop
+        return _shared_loop
+
+
+def run_sync(coroutine):
+    """Run a coroutine on the shared loop and block until it is done"""
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_shared_loop())
+    return future.result()
+
+
+class SyncAirConditionerController(AirConditionerController):
+    """Blocking controller served by an AsyncAirConditionerController
+
+    Exchanges run on the shared background loop, both controllers share
+    the same AirConditionerData so AirConditionerModel works unchanged.
+    """
+
+    def __init__(self, host: str, port: int = 1998, timeout: float = 10.0,
+                 max_length: int = MAX_FRAME_LENGTH) -> None:
+        # Created first, the base initializer sets the forwarded attributes
+        self.core = AsyncAirConditionerController(host, port, timeout, max_length)
+        super().__init__(host, port)
+        self.data = self.core.data
+
+    def _make_transport(self):
+        # Exchanges are delegated to the core controller
+        return None
+
+    @property
+    def recorder(self):
+        return self.core.recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        self.core.recorder = recorder
+
+    @property
+    def timing(self):
+        return self.core.timing
+
+    @timing.setter
+    def timing(self, sink):
+        self.core.timing = sink
+
+    @property
+    def inner_temperature(self):
+        return self.core.inner_temperature
+
+    @inner_temperature.setter
+    def inner_temperature(self, value):
+        self.core.inner_temperature = value
+
+    @property
+    def inner_temperature_float(self):
+        return self.core.inner_temperature_float
+
+    @inner_temperature_float.setter
+    def inner_temperature_float(self, value):
+        self.core.inner_temperature_float = value
+
+    @property
+    def pool_stats(self):
+        return None
+
+    def _run_command(self, force: bool = False) -> bool:
+        return run_sync(self.core._run_command(force))
+
+    def _run_get_info(self) -> bool:
+        return run_sync(self.core._run_get_info())
+
+    def _raw_send(self, message, phases: dict = None) -> bytes:
+        return run_sync(self.core._raw_send(message, phases))
+
+    def close(self):
+        run_sync(self.core.close())
@@ -1,21 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import socket
 import logging
-import math
+import time
 
 from enum import IntEnum
+from functools import lru_cache
 
-from crcmod.predefined import mkPredefinedCrcFun
 from .ac_data import AirConditionerData
-from .convert import (
-    byte2sbyte,
-    sbyte2byte,
-    barray2blist,
-    barray2hexlist,
-    barray2sblist,
-)
+from .connection import ConnectionPool, get_default_pool
+from .crc import crc16_modbus, crc_bytes
+from . import metrics, trace
+from .timing import PERCENTILES, RingBufferSink, add_phase
+from .convert import sbyte2byte
 
 _logger = logging.getLogger(__name__)
 
@@ -144,16 +141,153 @@ def raw_to_celcius(value: int) -> int:
     return value + 16
 
 
-modbus_crc = mkPredefinedCrcFun('modbus')
+class Field:
+    """Bits of one payload byte holding a field
+
+    Args:
+        name (str): Key of the field in the decoded state
+        byte (str): Payload byte name (d1..d4)
+        mask (int): Bits of the field in the byte
+        shift (int): Position of the lowest bit of the field
+        type (type): bool fields are True when the value equals 1
+    """
+
+    __slots__ = ('name', 'byte', 'index', 'mask', 'clear_mask', 'shift', 'type')
+
+    def __init__(self, name: str, byte: str, mask: int, shift: int,
+                 type=int) -> None:
+        self.name = name
+        self.byte = byte
+        self.index = AirConditionerData.NAMES.index(byte)
+        self.mask = mask
+        self.clear_mask = ~mask & 0xff
+        self.shift = shift
+        self.type = type
+
+    def __repr__(self) -> str:
+        return 'Field(%s, %s, mask=0x%02x, shift=%d)' % (
+            self.name, self.byte, self.mask, self.shift
+        )
+
+
+class BitField:
+    POWER = Field('power', 'd1', invert(Command.POWER), 3, bool)
+    TURBO = Field('turbo', 'd1', invert(Command.TURBO), 7, bool)
+    MODE = Field('mode', 'd1', invert(Command.MODE), 0)
+    FAN_SPEED = Field('fan_speed', 'd1', invert(Command.FAN_SPEED), 4)
+    TEMPERATURE_SET = Field(
+        'temperature_set', 'd2', invert(Command.TEMPERATURE_SET), 0
+    )
+    MUTE = Field('mute', 'd2', invert(Command.MUTE), 6, bool)
+    TEMPERATURE_MODE = Field(
+        'temperature_mode', 'd2', invert(Command.TEMPERATURE_MODE), 5, bool
+    )
+    SWING_LEFT_RIGHT = Field(
+        'swing_left_right', 'd3', invert(Command.WIND_LEFT_RIGHT), 4, bool
+    )
+    SWING_UP_DOWN = Field(
+        'swing_up_down', 'd3', invert(Command.WIND_UP_DOWN), 0, bool
+    )
+    AUXILIARY_HEATING = Field(
+        'auxiliary_heating', 'd4', invert(Command.AUXILIARY_HEATING), 4, bool
+    )
+    SLEEP = Field('sleep', 'd4', invert(Command.SLEEP), 1, bool)
+    ENERGY_SAVING = Field(
+        'energy_saving', 'd4', invert(Command.ENERGY_SAVING), 0, bool
+    )
+    FILTER_PM25 = Field('filter', 'd4', invert(Command.FILTER_PM25), 6, bool)
+    LIGHT = Field('light', 'd4', invert(Command.LIGHT), 7, bool)
+
+
+# Fields of the decoded state, in the order of _get_state
+STATE_FIELDS = (
+    BitField.AUXILIARY_HEATING,
+    BitField.TEMPERATURE_MODE,
+    BitField.TEMPERATURE_SET,
+    BitField.SWING_LEFT_RIGHT,
+    BitField.SWING_UP_DOWN,
+    BitField.ENERGY_SAVING,
+    BitField.FAN_SPEED,
+    BitField.FILTER_PM25,
+    BitField.LIGHT,
+    BitField.MODE,
+    BitField.MUTE,
+    BitField.POWER,
+    BitField.SLEEP,
+    BitField.TURBO,
+)
+
+_STATE_DECODER = tuple(
+    (field.name, field.index, field.mask, field.shift, field.type is bool)
+    for field in STATE_FIELDS
+)
+
+
+def decode_state(payload) -> dict:
+    """Decode every field of a payload (wire order) in a single pass"""
+    res = {}
+    for name, index, mask, shift, is_bool in _STATE_DECODER:
+        value = (payload[index] & mask) >> shift
+        res[name] = value == 1 if is_bool else value
+    if res['temperature_mode']:
+        res['temperature_set'] = raw_to_fahrenheit(res['temperature_set'])
+    else:
+        res['temperature_set'] = raw_to_celcius(res['temperature_set'])
+    return res
+
+
+modbus_crc = crc16_modbus
+
+HEADER_LENGTH = 0x0a  # 10
+CRC_LENGTH = 0x02  # 2
+COMMAND_LENGTH = HEADER_LENGTH + AirConditionerData.SIZE + CRC_LENGTH
+# Replies carrying the unit state (d1..d10 at 13..22)
+REPLY_LENGTH = 25
+
+
+@lru_cache(maxsize=None)
+def frame_header(type: Query, length: int) -> tuple:
+    """Return the fixed header of a frame and its CRC state
+
+    Headers only depend on the query type and the frame length, so the
+    CRC of the payload can start from the cached header state.
+    """
+    header = bytes((
+        Datagram.HEADER, Datagram.HEADER, Datagram.DST_ADDRESS,
+        Datagram.SRC_ADDRESS, length, Datagram.AC_ID1, Datagram.AC_ID2,
+        int(type), Datagram.AC_DATA0, Datagram.AC_DATA1
+    ))
+    return header, crc16_modbus(header)
 
 
 class AirConditionerController:
-    def __init__(self, host: str, port: int = 1998) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int = 1998,
+        transport: ConnectionPool = None,
+    ) -> None:
         self.host = host
         self.port = port
+        # Connections are shared between controllers of the same host
+        self.transport = transport if transport is not None else self._make_transport()
         self.data = AirConditionerData()
+        self._command_frame = bytearray(COMMAND_LENGTH)
+        self._state = None
+        self._state_version = -1
+        # CaptureRecorder receiving every exchange, see skyworth.capture
+        self.recorder = None
+        # Room temperature of the last GET_INFO reply, None until then
+        self.inner_temperature = None
+        self.inner_temperature_float = None
+        # Sink of the phase timings, see skyworth.timing
+        self.timing = None
         self._reset_data()
 
+    def _make_transport(self):
+        """Transport used when none is given, the shared ConnectionPool"""
+        return get_default_pool()
+
     def _reset_data(self):
         self.data.d1 = 0
         self.data.d2 = 0
@@ -168,36 +302,71 @@ class AirConditionerController:
         self.data.d13 = 0
         self.data.d14 = 0
 
+    @property
+    def pool_stats(self):
+        return self.transport.stats((self.host, self.port))
+
+    def enable_timing(self, sink=None):
+        """Time the phases of every exchange
+
+        Args:
+            sink (callable, optional): Called with (address, operation,
+                phases), a RingBufferSink by default
+
+        Returns:
+            The sink
+        """
+        self.timing = sink if sink is not None else RingBufferSink()
+        return self.timing
+
+    def disable_timing(self):
+        self.timing = None
+
+    def latency_summary(self, percentiles=PERCENTILES,
+                        operation: str = None) -> dict:
+        """Percentiles in nanoseconds of every phase kept by the sink
+
+        Returns:
+            dict: phase -> {'count': n, 'p50': ns, ...}, empty unless a
+                sink with a summary (RingBufferSink) is attached
+        """
+        summary = getattr(self.timing, 'summary', None)
+        if summary is None:
+            return {}
+        return summary(percentiles, operation)
+
+    def _emit_timing(self, operation: str, phases: dict, start: int):
+        add_phase(phases, 'total', start)
+        self.timing((self.host, self.port), operation, phases)
+
+    def _get_field(self, field: Field):
+        value = (self.data[field.index] & field.mask) >> field.shift
+        return value == 1 if field.type is bool else value
+
+    def _set_field(self, field: Field, value):
+        self.data[field.index] = (
+            (self.data[field.index] & field.clear_mask) |
+            ((int(value) << field.shift) & field.mask)
+        )
+
     def _get_power(self) -> bool:
-        res = (self.data.d1 & invert(Command.POWER)) >> 3
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.POWER)
 
     def _set_power(self, state: bool):
-        if state:
-            self.data.d1 |= invert(Command.POWER)
-        else:
-            self.data.d1 &= ~invert(Command.POWER)
+        self._set_field(BitField.POWER, state)
 
     def _get_turbo(self) -> bool:
-        res = (self.data.d1 & invert(Command.TURBO)) >> 7
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.TURBO)
 
     def _set_turbo(self, state: bool):
         # Also called super mode
-        if state:
-            self.data.d1 |= invert(Command.TURBO)
-        else:
-            self.data.d1 &= ~invert(Command.TURBO)
+        self._set_field(BitField.TURBO, state)
 
     def _get_mode(self):
-        res = (self.data.d1 & invert(Command.MODE)) >> 0
-        return res % 255
+        return self._get_field(BitField.MODE)
 
     def _set_mode(self, value: int):
-        controlbit = (value << 0) % 255
-        self.data.d1 = (self.data.d1 & Command.MODE) | controlbit
+        self._set_field(BitField.MODE, value)
 
     def _get_swing(self):
         return self.data.d3
@@ -208,45 +377,34 @@ class AirConditionerController:
     def _set_swing_off(self):
         self._set_swing(0)
 
-    def _get_swing_left_right(self) -> int:
-        res = (self.data.d3 & invert(Command.WIND_LEFT_RIGHT)) >> 4
-        res = res % 255
-        return True if res == 1 else False
+    def _get_swing_left_right(self) -> bool:
+        return self._get_field(BitField.SWING_LEFT_RIGHT)
 
     def _set_swing_left_right(self, state: bool):
-        control = 1 if state else 0
-        controlbit = (control << 4) % 255
-        self.data.d3 = (self.data.d3 & Command.WIND_LEFT_RIGHT) | controlbit
+        self._set_field(BitField.SWING_LEFT_RIGHT, state)
 
-    def _get_swing_up_down(self) -> int:
-        res = (self.data.d3 & invert(Command.WIND_UP_DOWN)) >> 0
-        res = res % 255
-        return True if res == 1 else False
+    def _get_swing_up_down(self) -> bool:
+        return self._get_field(BitField.SWING_UP_DOWN)
 
     def _set_swing_up_down(self, state: bool):
-        control = 1 if state else 0
-        controlbit = (control << 0) % 255
-        self.data.d3 = (self.data.d3 & Command.WIND_UP_DOWN) | controlbit
+        self._set_field(BitField.SWING_UP_DOWN, state)
 
     def _get_fan_speed(self) -> int:
-        res = (self.data.d1 & invert(Command.FAN_SPEED)) >> 4
-        value = res % 255
-        return value
+        return self._get_field(BitField.FAN_SPEED)
 
     def _set_fan_speed(self, value: int):
         assert (value <= 6)
-        controlbit = (value << 4) % 255
-        self.data.d1 = (self.data.d1 & Command.FAN_SPEED) | controlbit
+        self._set_field(BitField.FAN_SPEED, value)
 
     def _set_temperature_set(self, temperature: int):
         if self._get_temperature_mode():
             value = fahrenheit_to_raw(temperature)
         else:
             value = celcius_to_raw(temperature)
-        self.data.d2 = (self.data.d2 & Command.TEMPERATURE_SET) | value
+        self._set_field(BitField.TEMPERATURE_SET, value)
 
     def _get_temperature_set(self) -> int:
-        value = self.data.d2 & invert(Command.TEMPERATURE_SET)
+        value = self._get_field(BitField.TEMPERATURE_SET)
         if self._get_temperature_mode():
             temperature = raw_to_fahrenheit(value)
         else:
@@ -254,20 +412,13 @@ class AirConditionerController:
         return temperature
 
     def _get_mute(self) -> bool:
-        res = (self.data.d2 & invert(Command.MUTE)) >> 6
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.MUTE)
 
     def _set_mute(self, state: bool):
-        if state:
-            self.data.d2 |= invert(Command.MUTE)
-        else:
-            self.data.d2 &= ~invert(Command.MUTE)
+        self._set_field(BitField.MUTE, state)
 
     def _get_temperature_mode(self) -> bool:
-        res = (self.data.d2 & invert(Command.TEMPERATURE_MODE)) >> 5
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.TEMPERATURE_MODE)
 
     def _set_temperature_mode(self, state: bool):
         """ Change Temperature mode to Celsius/Fahrenheit
@@ -276,111 +427,152 @@ class AirConditionerController:
                 if True: Celsius to Fahrenheit
                 if False: Fahrenheit to Celsius
         """
-        control = 1 if state else 0
-        controlbit = (control << 5) % 255
-        self.data.d2 = (self.data.d2 & Command.TEMPERATURE_MODE) | controlbit
+        self._set_field(BitField.TEMPERATURE_MODE, state)
 
     def _get_auxiliary_heating(self) -> bool:
-        res = (self.data.d4 & invert(Command.AUXILIARY_HEATING)) >> 4
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.AUXILIARY_HEATING)
 
     def _set_auxiliary_heating(self, state: bool):
-        if state:
-            self.data.d4 |= invert(Command.AUXILIARY_HEATING)
-        else:
-            self.data.d4 &= ~invert(Command.AUXILIARY_HEATING)
+        self._set_field(BitField.AUXILIARY_HEATING, state)
 
     def _get_sleep(self) -> bool:
-        res = (self.data.d4 & invert(Command.SLEEP)) >> 1
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.SLEEP)
 
     def _set_sleep(self, state: bool):
-        if state:
-            self.data.d4 |= invert(Command.SLEEP)
-        else:
-            self.data.d4 &= ~invert(Command.SLEEP)
+        self._set_field(BitField.SLEEP, state)
 
     def _get_energy_saving(self) -> bool:
-        res = (self.data.d4 & invert(Command.ENERGY_SAVING)) >> 0
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.ENERGY_SAVING)
 
     def _set_energy_saving(self, state: bool):
-        control = 1 if state else 0
-        if control:
-            self.data.d4 |= invert(Command.ENERGY_SAVING)
-        else:
-            self.data.d4 &= ~invert(Command.ENERGY_SAVING)
+        self._set_field(BitField.ENERGY_SAVING, state)
 
     def _get_filter(self) -> bool:
-        res = (self.data.d4 & invert(Command.FILTER_PM25)) >> 6
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.FILTER_PM25)
 
     def _set_filter(self, state: bool):
-        if state:
-            self.data.d4 |= invert(Command.FILTER_PM25)
-        else:
-            self.data.d4 &= ~invert(Command.FILTER_PM25)
+        self._set_field(BitField.FILTER_PM25, state)
 
     def _get_light(self) -> bool:
-        res = (self.data.d4 & invert(Command.LIGHT)) >> 7
-        res = res % 255
-        return True if res == 1 else False
+        return self._get_field(BitField.LIGHT)
 
     def _set_light(self, state: bool):
-        if state:
-            self.data.d4 |= invert(Command.LIGHT)
-        else:
-            self.data.d4 &= ~invert(Command.LIGHT)
-
-    def _get_state(self):
-        res = {
-            'auxiliary_heating': self._get_auxiliary_heating(),
-            'temperature_mode': self._get_temperature_mode(),
-            'temperature_set': self._get_temperature_set(),
-            'swing_left_right': self._get_swing_left_right(),
-            'swing_up_down': self._get_swing_up_down(),
-            'energy_saving': self._get_energy_saving(),
-            'fan_speed': self._get_fan_speed(),
-            'filter': self._get_filter(),
-            'light': self._get_light(),
-            'mode': self._get_mode(),
-            'mute': self._get_mute(),
-            'power': self._get_power(),
-            'sleep': self._get_sleep(),
-            'turbo': self._get_turbo(),
-        }
-        return res
-
-    def _run_command(self):
+        self._set_field(BitField.LIGHT, state)
+
+    def _get_state(self) -> dict:
+        """Decode all fields, memoized until the data changes
+
+        The returned dict is shared between calls and must not be modified.
+        """
+        version = self.data.version
+        if self._state_version != version:
+            self._state = decode_state(self.data.payload)
+            self._state_version = version
+        return self._state
+
+    def _build_command_frame(self) -> bytearray:
+        # The payload is copied straight into the reused frame buffer
+        header, crc16 = frame_header(Query.TYPE_COMMAND, COMMAND_LENGTH)
+        frame = self._command_frame
+        frame[:HEADER_LENGTH] = header
+        self.data.write_into(frame, HEADER_LENGTH)
+        crc16 = crc16_modbus(
+            memoryview(frame)[HEADER_LENGTH:COMMAND_LENGTH - CRC_LENGTH], crc16
+        )
+        frame[-2] = (crc16 >> 8) & 0xff
+        frame[-1] = crc16 & 0xff
+        return frame
+
+    def _run_command(self, force: bool = False) -> bool:
+        """Send the data to the unit
+
+        The unit answers with its new state, which replaces the data so
+        no GET_INFO is needed to confirm the command.
+
+        Returns:
+            bool: False if the command was skipped since nothing changed
+                or its reply was rejected, the data then stays dirty
+        """
         _logger.info('_run_command')
-        data = [
-            self.data.d13, self.data.d14, self.data.d1, self.data.d2, self.data.d3,
-            self.data.d4, self.data.d5, self.data.d6, self.data.d7, self.data.d8,
-            self.data.d9, self.data.d10
-        ]
-        self._send(Query.TYPE_COMMAND, data)
+        if not force and not self.data.is_dirty():
+            _logger.debug('Data unchanged since last exchange, command skipped')
+            return False
+        if metrics.REGISTRY is not None:
+            metrics.REGISTRY.device((self.host, self.port)).commands += 1
+        if self.timing is None:
+            reply = self._raw_send(self._build_command_frame())
+            return self._parse_command_reply(reply)
+        phases = {}
+        start = time.monotonic_ns()
+        try:
+            frame = self._build_command_frame()
+            add_phase(phases, 'encode', start)
+            reply = self._raw_send(frame, phases)
+            decode = time.monotonic_ns()
+            result = self._parse_command_reply(reply)
+            add_phase(phases, 'decode', decode)
+        finally:
+            self._emit_timing('command', phases, start)
+        return result
+
+    def _parse_command_reply(self, reply: bytes) -> bool:
+        """Keep the state echoed in a TYPE_COMMAND reply
+
+        An empty or short reply carries no state, the data is assumed
+        applied as sent. A full reply that cannot be parsed (bad CRC) is
+        not, the data stays dirty so the command is sent again.
+
+        Returns:
+            bool: False if a full reply was rejected
+        """
+        if len(reply) >= REPLY_LENGTH:
+            return self._parse_info(reply, mask_d4=False)
+        self.data.mark_synced()
+        return True
 
     def _run_get_info(self):
         _logger.info('_run_get_info')
-        data = self._send(Query.TYPE_GET_INFO)
+        if metrics.REGISTRY is not None:
+            metrics.REGISTRY.device((self.host, self.port)).infos += 1
+        if self.timing is None:
+            data = self._send(Query.TYPE_GET_INFO)
+            return self._parse_info(data)
+        phases = {}
+        start = time.monotonic_ns()
+        try:
+            data = self._send(Query.TYPE_GET_INFO, phases=phases)
+            decode = time.monotonic_ns()
+            result = self._parse_info(data)
+            add_phase(phases, 'decode', decode)
+        finally:
+            self._emit_timing('get_info', phases, start)
+        return result
+
+    def _parse_info(self, data: bytes, mask_d4: bool = True) -> bool:
+        """Update the data from a unit reply
+
+        Args:
+            data (bytes): Reply frame
+            mask_d4 (bool, optional): Clear d4 bit 0 (energy saving) as for
+                GET_INFO replies, False keeps the bit 0 just sent, for
+                TYPE_COMMAND echoes
+
+        Returns:
+            bool: True if the reply carried a valid state
+        """
         if len(data) >= 2 and (data[0] == data[1] == Datagram.HEADER):
             # _logger.info('Header is correct')
             # Split data array to get only valid data for one side
             # and crc data only for yhe other side
-            data_crc_array = data[-2:]
-            data_without_crc = data[:-2]
+            data_crc = (data[-2] << 8) | data[-1]
+            data_without_crc = memoryview(data)[:-2]
             # Regenerate CRC from our side
-            crc16 = modbus_crc(bytearray(data_without_crc))
-            computed_crc_array = [
-                (crc16 >> 8) & 0xff,
-                crc16 & 0xff,
-            ]
+            crc16 = crc16_modbus(data_without_crc)
             # Check if CRC matches:
-            if data_crc_array == computed_crc_array:
+            if data_crc == crc16 and len(data) < REPLY_LENGTH:
+                # The decoder only guarantees the LENGTH byte, not a state
+                _logger.error('Reply too short: %d bytes', len(data))
+            elif data_crc == crc16:
                 # _logger.info('CRC is correct')
                 protocol_version = data[8]
                 aircondition_motherboard_version = data[9]
@@ -395,79 +587,120 @@ class AirConditionerController:
                 # _logger.info(f'wifi_cmd={wifi_cmd}')
 
                 if data[3] == Datagram.DST_ADDRESS:
-                    inner_temperature = data[10]
-                    inner_temperature_float = data[11]
-                    _logger.info(f'inner_temperature={inner_temperature}')
+                    self.inner_temperature = data[10]
+                    self.inner_temperature_float = data[11]
+                    _logger.info('inner_temperature=%d', self.inner_temperature)
                     _logger.info(
-                        f'inner_temperature_float={inner_temperature_float}'
+                        'inner_temperature_float=%d',
+                        self.inner_temperature_float
                     )
 
                     self.data.d1 = data[13]
                     self.data.d2 = data[14]
                     self.data.d3 = data[15]
-                    self.data.d4 = data[16] & 254
+                    if mask_d4:
+                        self.data.d4 = data[16] & 254
+                    else:
+                        self.data.d4 = (data[16] & 254) | (self.data.d4 & 1)
                     self.data.d5 = data[17]
                     self.data.d6 = data[18]
                     self.data.d7 = data[19]
                     self.data.d8 = data[20]
                     self.data.d9 = data[21]
                     self.data.d10 = data[22]
-
-                    fan = ((data[13] & 112) >> 4)
-                    print(fan)
+                    self.data.mark_synced()
 
                     # self._save_swing_state()
                     # self._save_fan_speed()
+                    return True
                 elif data[3] == Datagram.WIFI_ADDRESS:
                     pass
 
             else:
                 _logger.error('Invalid CRC')
+                if metrics.REGISTRY is not None:
+                    metrics.REGISTRY.device((self.host, self.port)).crc_failures += 1
+        return False
 
-    def _send(self, type: Query, data=[]) -> list:
-        """Build datagram with message data
+    def _send(self, type: Query, data=b'', phases: dict = None) -> bytes:
+        """Build datagram with message data and send it
 
         Args:
             type (Query): Get or Set data
-            data (list, optional): [description]. Defaults to [].
+            data (bytes, optional): Payload. Defaults to b''.
+            phases (dict, optional): Filled with the phase timings
 
         Returns:
-            list: [description]
+            bytes: Reply frame
         """
-        BASE_LENGTH = 0x0a  # 10
-        CRC_LENGTH = 0x02  # 2
-        LENGTH = BASE_LENGTH + len(data) + CRC_LENGTH
-
-        raw_message = [
-            Datagram.HEADER, Datagram.HEADER, Datagram.DST_ADDRESS,
-            Datagram.SRC_ADDRESS, LENGTH, Datagram.AC_ID1, Datagram.AC_ID2,
-            int(type), Datagram.AC_DATA0, Datagram.AC_DATA1
-        ] + data
-
-        crc16 = modbus_crc(bytearray(raw_message))
-        crc_array = [
-            (crc16 >> 8) & 0xff,
-            crc16 & 0xff,
-        ]
-
-        raw_message += crc_array
-        return self._raw_send(raw_message)
-
-    def _raw_send(self, message: list) -> list:
-        BUFFER_SIZE = 1024
-
-        raw_message = bytearray(message)
-        _logger.debug("data >> %s", barray2hexlist(raw_message))
-        _logger.debug("data >> %s", barray2sblist(raw_message))
-
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((self.host, self.port))
-        s.send(raw_message)
-        raw_data = s.recv(BUFFER_SIZE)
-        s.close()
-
-        _logger.debug("data << %s", barray2hexlist(raw_data))
-        _logger.debug("data << %s", barray2sblist(raw_data))
-
-        data = barray2blist(raw_data)
-        return data
+        if phases is None:
+            return self._raw_send(self._build_frame(type, data))
+        start = time.monotonic_ns()
+        frame = self._build_frame(type, data)
+        add_phase(phases, 'encode', start)
+        return self._raw_send(frame, phases)
+
+    @staticmethod
+    def _build_frame(type: Query, data=b'') -> bytearray:
+        LENGTH = HEADER_LENGTH + len(data) + CRC_LENGTH
+
+        header, crc16 = frame_header(type, LENGTH)
+        raw_message = bytearray(LENGTH)
+        raw_message[:HEADER_LENGTH] = header
+        if data:
+            raw_message[HEADER_LENGTH:-CRC_LENGTH] = data
+            crc16 = crc16_modbus(
+                memoryview(raw_message)[HEADER_LENGTH:-CRC_LENGTH], crc16
+            )
+
+        raw_message[-CRC_LENGTH:] = crc_bytes(crc16)
+        return raw_message
+
+    def _raw_send(self, message, phases: dict = None) -> bytes:
+        """Exchange a frame with the unit
+
+        Args:
+            message (bytes): Frame to send
+            phases (dict, optional): Filled with the phase timings, the
+                exchange is timed on its own when timing is enabled
+        """
+        if isinstance(message, (bytes, bytearray)):
+            raw_message = message
+        else:
+            raw_message = bytearray(message)
+        # Frames are only rendered when a trace sink is attached
+        if trace.SINKS:
+            trace.trace_frame(trace.SEND, (self.host, self.port), raw_message)
+
+        if self.recorder is None and phases is None and self.timing is None:
+            raw_data = self.transport.exchange((self.host, self.port), raw_message)
+        else:
+            raw_data = self._timed_exchange(raw_message, phases)
+
+        if trace.SINKS:
+            trace.trace_frame(trace.RECEIVE, (self.host, self.port), raw_data)
+
+        return raw_data
+
+    def _timed_exchange(self, raw_message, phases: dict) -> bytes:
+        own = phases is None and self.timing is not None
+        if own:
+            phases = {}
+        timestamp = time.time_ns()
+        start = time.monotonic_ns()
+        try:
+            if phases is None:
+                raw_data = self.transport.exchange((self.host, self.port), raw_message)
+            else:
+                raw_data = self.transport.exchange(
+                    (self.host, self.port), raw_message, phases
+                )
+            duration = time.monotonic_ns() - start
+        finally:
+            if phases is not None:
+                add_phase(phases, 'exchange', start)
+            if own:
+                self._emit_timing('raw_send', phases, start)
+        if self.recorder is not None:
+            self.recorder.record(timestamp, duration, raw_message, raw_data)
+        return raw_data
@@ -14,9 +14,41 @@ from .convert import (
 _logger = logging.getLogger(__name__)
 
 
+def _byte_property(name: str, index: int) -> property:
+    def getter(self):
+        return self._data[index]
+
+    def setter(self, value):
+        self._set_byte_value(name, index, value)
+
+    return property(getter, setter)
+
+
 class AirConditionerData:
+    """The 12 payload bytes of a command, stored in wire order
+
+    Bytes live in a single bytearray (d13, d14, d1..d10) so the payload
+    can be copied into a frame buffer through a memoryview.
+    """
+
+    __slots__ = ('_data', '_dirty', '_last_sent', '_version')
+
+    # Wire order of the command payload
+    NAMES = (
+        'd13', 'd14', 'd1', 'd2', 'd3', 'd4', 'd5', 'd6', 'd7', 'd8', 'd9',
+        'd10'
+    )
+    SIZE = len(NAMES)
+
     def __init__(self) -> None:
-        self._data = [0 for x in range(12)]
+        self._data = bytearray(AirConditionerData.SIZE)
+        # Bitmask of the indexes changed since the unit last acknowledged
+        # the data
+        self._dirty = 0
+        # Bytes the unit last acknowledged, None until the first exchange
+        self._last_sent = None
+        # Incremented on every change, used to memoize decoding
+        self._version = 0
 
     @classmethod
     def _debug_value(cls, property_name, value, symbol='->'):
@@ -51,109 +83,81 @@ class AirConditionerData:
         }
         return res
 
-    def _set_byte_value(self, property_name, index, value):
-        if self._data[index] != value:
-            AirConditionerData._debug_value(
-                property_name, self._data[index], '=='
-            )
-            self._data[index] = value
-            AirConditionerData._debug_value(property_name, value)
-
-    @property
-    def d13(self):
-        return self._data[0]
-
-    @d13.setter
-    def d13(self, value):
-        self._set_byte_value('d13', 0, value)
-
-    @property
-    def d14(self):
-        return self._data[1]
-
-    @d14.setter
-    def d14(self, value):
-        self._set_byte_value('d14', 1, value)
-
-    @property
-    def d1(self):
-        return self._data[2]
-
-    @d1.setter
-    def d1(self, value):
-        self._set_byte_value('d1', 2, value)
-
-    @property
-    def d2(self):
-        return self._data[3]
-
-    @d2.setter
-    def d2(self, value):
-        self._set_byte_value('d2', 3, value)
-
-    @property
-    def d3(self):
-        return self._data[4]
-
-    @d3.setter
-    def d3(self, value):
-        self._set_byte_value('d3', 4, value)
-
-    @property
-    def d4(self):
-        return self._data[5]
-
-    @d4.setter
-    def d4(self, value):
-        self._set_byte_value('d4', 5, value)
-
-    @property
-    def d5(self):
-        return self._data[6]
-
-    @d5.setter
-    def d5(self, value):
-        self._set_byte_value('d5', 6, value)
-
     @property
-    def d6(self):
-        return self._data[7]
+    def version(self) -> int:
+        return self._version
 
-    @d6.setter
-    def d6(self, value):
-        self._set_byte_value('d6', 7, value)
+    def __getitem__(self, index: int) -> int:
+        return self._data[index]
 
-    @property
-    def d7(self):
-        return self._data[8]
-
-    @d7.setter
-    def d7(self, value):
-        self._set_byte_value('d7', 8, value)
-
-    @property
-    def d8(self):
-        return self._data[9]
-
-    @d8.setter
-    def d8(self, value):
-        self._set_byte_value('d8', 9, value)
+    def __setitem__(self, index: int, value: int):
+        self._set_byte_value(AirConditionerData.NAMES[index], index, value)
 
     @property
-    def d9(self):
-        return self._data[10]
-
-    @d9.setter
-    def d9(self, value):
-        self._set_byte_value('d9', 10, value)
+    def payload(self) -> memoryview:
+        """Read-only view of the payload in wire order"""
+        return memoryview(self._data).toreadonly()
+
+    def write_into(self, buffer, offset: int = 0):
+        """Copy the payload into buffer[offset:offset + SIZE]"""
+        memoryview(buffer)[offset:offset + AirConditionerData.SIZE] = self._data
+
+    def snapshot(self) -> bytes:
+        return bytes(self._data)
+
+    def restore(self, snapshot: bytes):
+        for index, value in enumerate(snapshot):
+            if self._data[index] != value:
+                self._dirty |= 1 << index
+        self._data[:] = snapshot
+        self._version += 1
+
+    def dirty_fields(self) -> list:
+        """Names of the bytes differing from the last acknowledged data"""
+        if self._last_sent is None:
+            return list(AirConditionerData.NAMES)
+        last_sent = self._last_sent
+        return [
+            name for index, name in enumerate(AirConditionerData.NAMES)
+            if self._dirty >> index & 1 and self._data[index] != last_sent[index]
+        ]
+
+    def is_dirty(self) -> bool:
+        if self._last_sent is None:
+            return True
+        # Bytes set back to their acknowledged value are not dirty
+        return bool(self._dirty) and self._data != self._last_sent
+
+    def mark_synced(self):
+        """Record the current data as acknowledged by the unit"""
+        self._last_sent = bytes(self._data)
+        self._dirty = 0
 
-    @property
-    def d10(self):
-        return self._data[11]
-
-    @d10.setter
-    def d10(self, value):
-        self._set_byte_value('d10', 11, value)
+    def _set_byte_value(self, property_name, index, value):
+        if self._data[index] != value:
+            debug = _logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                AirConditionerData._debug_value(
+                    property_name, self._data[index], '=='
+                )
+            self._data[index] = value
+            self._dirty |= 1 << index
+            self._version += 1
+            if debug:
+                AirConditionerData._debug_value(property_name, value)
+
+    d13 = _byte_property('d13', 0)
+    d14 = _byte_property('d14', 1)
+    d1 = _byte_property('d1', 2)
+    d2 = _byte_property('d2', 3)
+    d3 = _byte_property('d3', 4)
+    d4 = _byte_property('d4', 5)
+    d5 = _byte_property('d5', 6)
+    d6 = _byte_property('d6', 7)
+    d7 = _byte_property('d7', 8)
+    d8 = _byte_property('d8', 9)
+    d9 = _byte_property('d9', 10)
+    d10 = _byte_property('d10', 11)
 
 
 if __name__ == "__main__":
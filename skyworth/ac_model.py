@@ -4,10 +4,22 @@
 from __future__ import annotations
 
 import logging
+import threading
+from contextlib import contextmanager
 from enum import IntEnum
 from pprint import pformat
 
-from .ac_controller import AirConditionerController, Mode
+from .ac_controller import (
+    STATE_FIELDS,
+    AirConditionerController,
+    BitField,
+    Field,
+    Mode,
+    celcius_to_raw,
+    decode_state,
+)
+from .ac_data import AirConditionerData
+from .cache import CacheStatus, StateCache
 
 _logger = logging.getLogger(__name__)
 
@@ -63,13 +75,172 @@ class TemperatureMode(IntEnum):
         return TemperatureMode.FAHRENHEIT if value else TemperatureMode.CELSIUS
 
 
-class AirConditionerModel:
-    def __init__(self, controller: AirConditionerController) -> None:
+# Seconds a confirmed state is written over without reading the unit,
+# changes made on the remote in the meantime are overwritten
+WRITE_TTL = 300.0
+
+# Bits of the payload (wire order, as a big endian int) behind each
+# decoded field. temperature_set also depends on temperature_mode.
+_PAYLOAD_BITS = 8 * AirConditionerData.SIZE
+FIELD_BITS = {
+    field.name: field.mask << (_PAYLOAD_BITS - 8 * (field.index + 1))
+    for field in STATE_FIELDS
+}
+FIELD_BITS[BitField.TEMPERATURE_SET.name] |= \
+    FIELD_BITS[BitField.TEMPERATURE_MODE.name]
+
+
+_MODE_OF_ACTION = {
+    ModeAction.AUTO: Mode.AUTO,
+    ModeAction.COOL: Mode.COOL,
+    ModeAction.HEAT: Mode.HEAT,
+    ModeAction.DEHUMIDIFIER: Mode.DEHUMIDIFIER,
+    ModeAction.FAN: Mode.FAN,
+}
+# Mode plans cover d1..d4
+D1_INDEX = AirConditionerData.NAMES.index('d1')
+
+
+class Subscription:
+    """Callback registered with AirConditionerModelBase.subscribe
+
+    Args:
+        fields (iterable): Names of the decoded fields, None for all
+        callback (callable): Called with (model, changes), changes maps
+            every changed field to its (old, new) value
+    """
+
+    __slots__ = ('fields', 'callback', 'mask')
+
+    def __init__(self, fields, callback) -> None:
+        if fields is None:
+            fields = tuple(FIELD_BITS)
+        elif isinstance(fields, str):
+            fields = (fields, )
+        unknown = set(fields) - set(FIELD_BITS)
+        if unknown:
+            raise ValueError('Unknown fields: %s' % ', '.join(sorted(unknown)))
+        self.fields = tuple(fields)
+        self.callback = callback
+        self.mask = 0
+        for name in self.fields:
+            self.mask |= FIELD_BITS[name]
+
+    def __repr__(self) -> str:
+        return 'Subscription(%s, %r)' % (', '.join(self.fields), self.callback)
+
+
+class AirConditionerModelBase:
+    """Field logic shared by the blocking and the asyncio models
+
+    Properties are read-only here, the `_apply_*` methods only mutate the
+    controller data. Subclasses decide how the command is sent.
+
+    Args:
+        controller (AirConditionerController): Controller of the unit
+        ttl (float, optional): Seconds during which `update_state` is
+            served from the cache without querying the unit
+        stale_ttl (float, optional): Extra seconds during which the stale
+            state is served while it is refreshed in the background
+        write_ttl (float, optional): Seconds during which setters write
+            over the last confirmed state without reading the unit first
+    """
+
+    def __init__(
+        self,
+        controller: AirConditionerController,
+        ttl: float = 1.0,
+        stale_ttl: float = 0.0,
+        write_ttl: float = WRITE_TTL,
+    ) -> None:
         self.controller = controller
+        self.cache = StateCache(ttl, stale_ttl)
+        self.write_ttl = write_ttl
+        # Nesting level of batch() and whether a command is waiting
+        self._batch_depth = 0
+        self._batch_pending = False
+        # Change subscriptions and the last payload confirmed by the unit
+        self._subscriptions = []
+        self._confirmed = None
+        # Data version of the last state confirmed by the unit
+        self._confirmed_version = -1
         self._reset_states()
 
+    def subscribe(self, fields, callback) -> Subscription:
+        """Call callback(model, changes) when one of the fields changes
+
+        States confirmed by the unit (GET_INFO replies and acknowledged
+        commands) are compared with the previous one. Fields are only
+        decoded when their payload bits differ.
+
+        Args:
+            fields (iterable): Names as in controller._get_state(), a
+                single name or None for every field
+            callback (callable): Receives the model and a dict
+                {field: (old, new)}
+        """
+        subscription = Subscription(fields, callback)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def _confirm(self) -> list:
+        """The unit holds our data, returns the pending callbacks"""
+        self.cache.touch()
+        self._confirmed_version = self.controller.data.version
+        return self._diff_confirmed()
+
+    def _needs_read(self) -> bool:
+        """Drift check run before a write outside of a batch
+
+        The local data may be written over the unit state while it was
+        confirmed less than write_ttl ago and the data did not change since
+        (a failed command or a restored batch leaves unconfirmed bytes).
+        The read ttl is not used, it only bounds update_state.
+        """
+        return (
+            self.cache.age() > self.write_ttl
+            or self.controller.data.version != self._confirmed_version
+        )
+
+    def _diff_confirmed(self) -> list:
+        """Record the confirmed payload and return the pending callbacks
+
+        Returns:
+            list: (callback, changes) of the subscriptions whose fields
+                changed since the previous confirmed payload
+        """
+        payload = self.controller.data.snapshot()
+        previous = self._confirmed
+        self._confirmed = payload
+        if previous is None or not self._subscriptions:
+            return []
+        changed = int.from_bytes(payload, 'big') ^ int.from_bytes(previous, 'big')
+        if not changed:
+            return []
+        calls = []
+        old = new = None
+        for subscription in self._subscriptions:
+            if not changed & subscription.mask:
+                continue
+            if old is None:
+                old = decode_state(previous)
+                new = decode_state(payload)
+            changes = {
+                name: (old[name], new[name]) for name in subscription.fields
+                if changed & FIELD_BITS[name] and old[name] != new[name]
+            }
+            if changes:
+                calls.append((subscription.callback, changes))
+        return calls
+
     def _reset_states(self):
         _logger.info('_reset_states')
+        # Compiled mode transitions, see _compile_mode_plan
+        self._mode_plans = {}
         # Used to save and restore swing state per mode
         self._swing_state = {
             ModeAction.AUTO: None,
@@ -100,6 +271,7 @@ class AirConditionerModel:
         current_mode = self.mode
         state = self.controller._get_swing()
         self._swing_state[current_mode] = state
+        self._mode_plans.pop(current_mode, None)
         _logger.debug(
             "Swing state for %s saved to %s",
             current_mode,
@@ -116,12 +288,13 @@ class AirConditionerModel:
                 current_mode,
                 self._swing_state[current_mode],
             )
-            self._set_swing_(state)
+            self.controller._set_swing(state)
 
     def _save_fan_speed(self):
         # saveWindSpeed
         current_mode = self.mode
         self._fan_speed[current_mode] = self.controller._get_fan_speed()
+        self._mode_plans.pop(current_mode, None)
         _logger.debug(
             "Fan speed for %s saved to %s",
             current_mode,
@@ -145,6 +318,7 @@ class AirConditionerModel:
         current_mode = self.mode
         self._temperature_set[current_mode
                              ] = self.controller._get_temperature_set()
+        self._mode_plans.pop(current_mode, None)
         _logger.debug(
             "Temperature set for %s saved to %d",
             current_mode,
@@ -163,41 +337,27 @@ class AirConditionerModel:
             )
             self.controller._set_temperature_set(temperature)
 
-    def update_state(self):
-        _logger.info('update_state')
-        self.controller._run_get_info()
-        state = self.controller._get_state()
-        _logger.info('\n' + pformat(state))
-        data = self.controller.data.get_debug_data()
-        _logger.info('\n' + pformat(data))
-
     @property
     def power(self) -> ControlAction:
-        _logger.info('power_get')
+        _logger.debug('power_get')
         value = self.controller._get_power()
         return ControlAction.from_bool(value)
 
-    @power.setter
-    def power(self, value: ControlAction):
-        _logger.info('power_set')
+    def _apply_power(self, value: ControlAction):
         self.controller._set_power(ControlAction.to_bool(value))
-        self.controller._run_command()
 
     @property
     def mute(self) -> ControlAction:
-        _logger.info('mute_get')
+        _logger.debug('mute_get')
         value = self.controller._get_mute()
         return ControlAction.from_bool(value)
 
-    @mute.setter
-    def mute(self, value: ControlAction):
-        _logger.info('mute_set')
+    def _apply_mute(self, value: ControlAction):
         self.controller._set_mute(ControlAction.to_bool(value))
-        self.controller._run_command()
 
     @property
     def swing(self) -> SwingAction:
-        _logger.info('swing_get')
+        _logger.debug('swing_get')
         lr = self.controller._get_swing_left_right()
         ud = self.controller._get_swing_up_down()
         if lr and ud:
@@ -210,9 +370,7 @@ class AirConditionerModel:
             res = SwingAction.OFF
         return res
 
-    @swing.setter
-    def swing(self, action: SwingAction):
-        _logger.info('swing_set')
+    def _apply_swing(self, action: SwingAction):
         self.controller._set_power(True)
         if action == SwingAction.OFF:
             self.controller._set_swing_off()
@@ -225,12 +383,11 @@ class AirConditionerModel:
         elif action == SwingAction.ALL:
             self.controller._set_swing_up_down(True)
             self.controller._set_swing_left_right(True)
-        self.controller._run_command()
         self._save_swing_state()
 
     @property
     def mode(self) -> ModeAction:
-        _logger.info('mode_get')
+        _logger.debug('mode_get')
         mode = self.controller._get_mode()
         if mode == Mode.AUTO:
             res = ModeAction.AUTO
@@ -247,104 +404,101 @@ class AirConditionerModel:
             res = ModeAction.AUTO
         return res
 
-    @mode.setter
-    def mode(self, action: ModeAction):
-        _logger.info('mode_set')
-        self.controller._set_power(True)
-        if action == ModeAction.AUTO:
-            self.controller._set_power(True)
-            self.controller._set_turbo(False)
-            self.controller._set_mode(Mode.AUTO)
-            self._restore_fan_speed()
-            self._restore_temperature_set()
-            self.controller._set_mute(False)
-            self._restore_swing_state()
-            self.controller._set_auxiliary_heating(False)
-            self.controller._set_sleep(False)
-            self.controller._set_energy_saving(False)
-        elif action == ModeAction.COOL:
-            self.controller._set_power(True)
-            self.controller._set_mode(Mode.COOL)
-            self._restore_fan_speed()
-            self._restore_temperature_set()
-            self.controller._set_mute(False)
-            self._restore_swing_state()
-            self.controller._set_auxiliary_heating(False)
-            self.controller._set_sleep(False)
-            self.controller._set_energy_saving(False)
-        elif action == ModeAction.HEAT:
-            self.controller._set_power(True)
-            self.controller._set_mode(Mode.HEAT)
-            self._restore_fan_speed()
-            self._restore_temperature_set()
-            self.controller._set_mute(False)
-            self._restore_swing_state()
-            self.controller._set_auxiliary_heating(True)
-            self.controller._set_sleep(False)
-            self.controller._set_energy_saving(False)
-        elif action == ModeAction.DEHUMIDIFIER:
-            self.controller._set_power(True)
-            self.controller._set_mode(Mode.DEHUMIDIFIER)
-            self.controller._set_turbo(False)
-            self.controller._set_fan_speed(1)
-            self._restore_temperature_set()
-            self.controller._set_mute(False)
-            self._restore_swing_state()
-            self.controller._set_auxiliary_heating(False)
-            self.controller._set_sleep(False)
-            self.controller._set_energy_saving(False)
-        elif action == ModeAction.FAN:
-            self.controller._set_power(True)
-            self.controller._set_mode(Mode.FAN)
-            self._restore_fan_speed()
-            self._restore_temperature_set()
-            self.controller._set_mute(False)
-            self._restore_swing_state()
-            self.controller._set_auxiliary_heating(False)
-            self.controller._set_sleep(False)
-            self.controller._set_energy_saving(False)
-        else:
-            raise Exception("Unknown ModeAction")
-        self.controller._run_command()
+    def _apply_mode(self, action: ModeAction):
+        plan = self._mode_plans.get(action)
+        if plan is None:
+            if action not in _MODE_OF_ACTION:
+                self.controller._set_power(True)
+                raise Exception("Unknown ModeAction")
+            plan = self._mode_plans[action] = self._compile_mode_plan(action)
+        d1_and, d1_or, d2_and, d2_or, d3_and, d3_or, d4_and, d4_or, \
+            temperature, temperature_raw = plan
+        data = self.controller.data
+        data.d1 = (data.d1 & d1_and) | d1_or
+        if temperature is not None and data.d2 & BitField.TEMPERATURE_MODE.mask:
+            # No precomputed raw value in fahrenheit
+            self.controller._set_temperature_set(temperature)
+        elif temperature is not None:
+            data.d2 = (data.d2 & BitField.TEMPERATURE_SET.clear_mask) | \
+                temperature_raw
+        data.d2 = (data.d2 & d2_and) | d2_or
+        data.d3 = (data.d3 & d3_and) | d3_or
+        data.d4 = (data.d4 & d4_and) | d4_or
+
+    def _compile_mode_plan(self, action: ModeAction) -> tuple:
+        """Fold the transition to a mode into AND/OR masks over d1..d4
+
+        The plan holds the bits forced by the mode and the fan speed,
+        swing and temperature saved for it. It is rebuilt whenever one of
+        them is saved again.
+
+        Returns:
+            tuple: d1..d4 (and, or) masks, then the saved temperature and
+                its celsius raw value (None when nothing is saved)
+        """
+        masks = [0xff, 0] * 4
+
+        def fold(field: Field, value):
+            index = 2 * (field.index - D1_INDEX)
+            masks[index] &= field.clear_mask
+            masks[index + 1] = (masks[index + 1] & field.clear_mask) | \
+                ((int(value) << field.shift) & field.mask)
+
+        fold(BitField.POWER, True)
+        if action in (ModeAction.AUTO, ModeAction.DEHUMIDIFIER):
+            fold(BitField.TURBO, False)
+        fold(BitField.MODE, _MODE_OF_ACTION[action])
+        if action == ModeAction.DEHUMIDIFIER:
+            fold(BitField.FAN_SPEED, 1)
+        elif self._fan_speed[action] is not None:
+            fold(BitField.FAN_SPEED, self._fan_speed[action])
+        fold(BitField.MUTE, False)
+        swing = self._swing_state[action]
+        if swing is not None:
+            # The whole d3 byte is restored
+            masks[4], masks[5] = 0, swing
+        fold(BitField.AUXILIARY_HEATING, action == ModeAction.HEAT)
+        fold(BitField.SLEEP, False)
+        fold(BitField.ENERGY_SAVING, False)
+
+        temperature = self._temperature_set[action]
+        temperature_raw = None
+        if temperature is not None:
+            temperature_raw = (
+                celcius_to_raw(temperature) << BitField.TEMPERATURE_SET.shift
+            ) & BitField.TEMPERATURE_SET.mask
+        return (*masks, temperature, temperature_raw)
 
     @property
     def temperature_set(self) -> int:
-        _logger.info('temperature_set_get')
+        _logger.debug('temperature_set_get')
         temperature_set = self.controller._get_temperature_set()
         return temperature_set
 
-    @temperature_set.setter
-    def temperature_set(self, value: int):
-        _logger.info('temperature_set_set')
+    def _apply_temperature_set(self, value: int):
         self.controller._set_temperature_set(value)
-        self.controller._run_command()
         self._save_temperature_set()
 
     @property
     def speed(self) -> SpeedAction:
-        _logger.info('speed_get')
+        _logger.debug('speed_get')
         speed = self.controller._get_fan_speed()
         return SpeedAction(speed)
 
-    @speed.setter
-    def speed(self, speed: SpeedAction):
-        _logger.info('speed_set')
+    def _apply_speed(self, speed: SpeedAction):
         self.controller._set_power(True)
         self.controller._set_turbo(False)
         self.controller._set_mute(False)
         self.controller._set_fan_speed(speed)
-        self.controller._run_command()
         self._save_fan_speed()
 
     @property
     def sleep(self) -> ControlAction:
-        _logger.info('sleep_get')
+        _logger.debug('sleep_get')
         value = self.controller._get_sleep()
         return ControlAction.from_bool(value)
 
-    @sleep.setter
-    def sleep(self, value: ControlAction):
-        _logger.info('sleep_set')
+    def _apply_sleep(self, value: ControlAction):
         current_mode = self.mode
         self.controller._set_power(True)
 
@@ -360,72 +514,283 @@ class AirConditionerModel:
                 ModeAction.AUTO, ModeAction.FAN
             )
             self.controller._set_sleep(ControlAction.to_bool(ControlAction.OFF))
-        self.controller._run_command()
 
     @property
     def filter_pm(self) -> ControlAction:
-        _logger.info('filter_pm_get')
+        _logger.debug('filter_pm_get')
         value = self.controller._get_filter()
         return ControlAction.from_bool(value)
 
-    @filter_pm.setter
-    def filter_pm(self, value: ControlAction):
-        _logger.info('filter_pm_set')
+    def _apply_filter_pm(self, value: ControlAction):
         self.controller._set_power(True)
         self.controller._set_filter(ControlAction.to_bool(value))
-        self.controller._run_command()
 
     @property
     def energy_saving(self) -> ControlAction:
-        _logger.info('energy_saving_get')
+        _logger.debug('energy_saving_get')
         value = self.controller._get_energy_saving()
         return ControlAction.from_bool(value)
 
-    @energy_saving.setter
-    def energy_saving(self, value: ControlAction):
-        _logger.info('energy_saving_set')
+    def _apply_energy_saving(self, value: ControlAction):
         self.controller._set_power(True)
         self.controller._set_energy_saving(ControlAction.to_bool(value))
-        self.controller._run_command()
 
     @property
     def turbo(self) -> ControlAction:
-        _logger.info('turbo_get')
+        _logger.debug('turbo_get')
         value = self.controller._get_turbo()
         return ControlAction.from_bool(value)
 
-    @turbo.setter
-    def turbo(self, value: ControlAction):
-        _logger.info('turbo_set')
+    def _apply_turbo(self, value: ControlAction):
         self.controller._set_power(True)
         self.controller._set_turbo(ControlAction.to_bool(value))
-        self.controller._run_command()
 
     @property
     def light(self) -> ControlAction:
-        _logger.info('light_get')
+        _logger.debug('light_get')
         value = self.controller._get_light()
         return ControlAction.from_bool(value)
 
-    @light.setter
-    def light(self, value: ControlAction):
-        _logger.info('light_set')
-        self.controller._run_get_info()
+    def _apply_light(self, value: ControlAction):
         self.controller._set_light(ControlAction.to_bool(value))
-        self.controller._run_command()
-        self.controller._run_get_info()
 
     @property
     def temperature_mode(self) -> TemperatureMode:
-        _logger.info('temperature_mode_get')
+        _logger.debug('temperature_mode_get')
         value = self.controller._get_temperature_mode()
         return TemperatureMode.from_bool(value)
 
-    @temperature_mode.setter
+    def _apply_temperature_mode(self, value: TemperatureMode):
+        self.controller._set_temperature_mode(TemperatureMode.to_bool(value))
+
+
+class AirConditionerModel(AirConditionerModelBase):
+    def __init__(
+        self,
+        controller: AirConditionerController,
+        ttl: float = 1.0,
+        stale_ttl: float = 0.0,
+        write_ttl: float = WRITE_TTL,
+    ) -> None:
+        super().__init__(controller, ttl, stale_ttl, write_ttl)
+        # Serialize exchanges with the background revalidation
+        self._lock = threading.RLock()
+        self._revalidation = None
+        self._polling = None
+        self._polling_stop = None
+
+    def _fetch(self):
+        with self._lock:
+            calls = self._fetch_locked()
+        self._notify(calls)
+
+    def _fetch_locked(self) -> list:
+        if not self.controller._run_get_info():
+            return []
+        return self._confirm()
+
+    def _notify(self, calls: list):
+        for callback, changes in calls:
+            try:
+                callback(self, changes)
+            except Exception:
+                _logger.exception('Subscription callback %r failed', callback)
+
+    def start_polling(self, interval: float = 5.0) -> threading.Thread:
+        """Query the unit every interval seconds from a daemon thread,
+        feeding the subscriptions
+        """
+        self.stop_polling()
+        stop = self._polling_stop = threading.Event()
+
+        def poll():
+            while True:
+                try:
+                    self.refresh(force=True)
+                except Exception as e:
+                    _logger.warning('Polling %s failed: %r', self.controller.host, e)
+                if stop.wait(interval):
+                    return
+
+        self._polling = threading.Thread(target=poll, daemon=True)
+        self._polling.start()
+        return self._polling
+
+    def stop_polling(self):
+        if self._polling is not None:
+            self._polling_stop.set()
+            if self._polling is not threading.current_thread():
+                self._polling.join()
+            self._polling = None
+
+    def _revalidate(self):
+        # A reply would overwrite the changes pending in a batch
+        if self._batch_depth:
+            return
+        try:
+            self._fetch()
+        except Exception as e:
+            _logger.warning('Background refresh failed: %r', e)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Query the unit unless the cached state is fresh enough
+
+        Args:
+            force (bool, optional): Ignore the cache
+
+        Returns:
+            bool: True if the unit was queried before returning
+        """
+        status = CacheStatus.MISS if force else self.cache.lookup()
+        if status == CacheStatus.FRESH:
+            return False
+        if status == CacheStatus.STALE:
+            revalidation = self._revalidation
+            if revalidation is None or not revalidation.is_alive():
+                self._revalidation = threading.Thread(
+                    target=self._revalidate, daemon=True
+                )
+                self._revalidation.start()
+            return False
+        self._fetch()
+        return True
+
+    def update_state(self):
+        _logger.info('update_state')
+        self.refresh()
+        if _logger.isEnabledFor(logging.INFO):
+            state = self.controller._get_state()
+            _logger.info('\n%s', pformat(state))
+            data = self.controller.data.get_debug_data()
+            _logger.info('\n%s', pformat(data))
+
+    def _write(self, apply, value):
+        """apply(value) to the data and send it in a single command
+
+        The cached state is trusted while the drift check passes, the
+        unit is only read first when it fails.
+        """
+        with self._lock:
+            # Only the thread holding an open batch gets past the lock
+            if self._batch_depth:
+                apply(value)
+                self._batch_pending = True
+                return
+            calls = self._fetch_locked() if self._needs_read() else []
+            apply(value)
+            calls += self._send_command_locked()
+        self._notify(calls)
+
+    def _send_command(self):
+        with self._lock:
+            calls = self._send_command_locked()
+        self._notify(calls)
+
+    def _send_command_locked(self) -> list:
+        if not self.controller._run_command():
+            return []
+        # Write-through, the unit now holds our data
+        return self._confirm()
+
+    @contextmanager
+    def batch(self):
+        """Group setters into a single command frame
+
+        Inside the block setters only update the local data, one command
+        is sent when the outermost block exits. If the block raises, the
+        data is restored and nothing is sent.
+
+        The model lock is held for the whole block: polls and setters of
+        other threads wait for the command instead of overwriting or
+        joining the pending changes.
+
+        Example:
+            with model.batch():
+                model.mode = ModeAction.COOL
+                model.temperature_set = 22
+                model.speed = SpeedAction.SPEED_3
+        """
+        calls = []
+        try:
+            with self._lock:
+                if not self._batch_depth and self._needs_read():
+                    calls = self._fetch_locked()
+                snapshot = self.controller.data.snapshot()
+                self._batch_depth += 1
+                try:
+                    yield self
+                except BaseException:
+                    self._batch_depth -= 1
+                    self.controller.data.restore(snapshot)
+                    if not self._batch_depth:
+                        self._batch_pending = False
+                    raise
+                self._batch_depth -= 1
+                if not self._batch_depth and self._batch_pending:
+                    self._batch_pending = False
+                    calls += self._send_command_locked()
+        finally:
+            self._notify(calls)
+
+    @AirConditionerModelBase.power.setter
+    def power(self, value: ControlAction):
+        _logger.info('power_set')
+        self._write(self._apply_power, value)
+
+    @AirConditionerModelBase.mute.setter
+    def mute(self, value: ControlAction):
+        _logger.info('mute_set')
+        self._write(self._apply_mute, value)
+
+    @AirConditionerModelBase.swing.setter
+    def swing(self, action: SwingAction):
+        _logger.info('swing_set')
+        self._write(self._apply_swing, action)
+
+    @AirConditionerModelBase.mode.setter
+    def mode(self, action: ModeAction):
+        _logger.info('mode_set')
+        self._write(self._apply_mode, action)
+
+    @AirConditionerModelBase.temperature_set.setter
+    def temperature_set(self, value: int):
+        _logger.info('temperature_set_set')
+        self._write(self._apply_temperature_set, value)
+
+    @AirConditionerModelBase.speed.setter
+    def speed(self, speed: SpeedAction):
+        _logger.info('speed_set')
+        self._write(self._apply_speed, speed)
+
+    @AirConditionerModelBase.sleep.setter
+    def sleep(self, value: ControlAction):
+        _logger.info('sleep_set')
+        self._write(self._apply_sleep, value)
+
+    @AirConditionerModelBase.filter_pm.setter
+    def filter_pm(self, value: ControlAction):
+        _logger.info('filter_pm_set')
+        self._write(self._apply_filter_pm, value)
+
+    @AirConditionerModelBase.energy_saving.setter
+    def energy_saving(self, value: ControlAction):
+        _logger.info('energy_saving_set')
+        self._write(self._apply_energy_saving, value)
+
+    @AirConditionerModelBase.turbo.setter
+    def turbo(self, value: ControlAction):
+        _logger.info('turbo_set')
+        self._write(self._apply_turbo, value)
+
+    @AirConditionerModelBase.light.setter
+    def light(self, value: ControlAction):
+        _logger.info('light_set')
+        self._write(self._apply_light, value)
+
+    @AirConditionerModelBase.temperature_mode.setter
     def temperature_mode(self, value: TemperatureMode):
         _logger.info('temperature_mode_set')
-        self.controller._set_temperature_mode(TemperatureMode.to_bool(value))
-        self.controller._run_command()
+        self._write(self._apply_temperature_mode, value)
 
 
 ###################################################################################
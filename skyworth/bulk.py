@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Vectorized decoding of recorded TYPE_GET_INFO replies
+
+Frames are rows of a 2-D uint8 array, each column is processed for all
+rows at once. The results match AirConditionerController._parse_info
+followed by _get_state, row by row.
+
+    frames = frames_from_capture(CaptureReader('units.cap'))
+    columns = decode_frames(frames)
+    columns['inner_temperature'][columns['valid']]
+
+numpy is an optional dependency, only needed by this module.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .ac_controller import (
+    STATE_FIELDS,
+    Datagram,
+    Query,
+    raw_to_celcius,
+    raw_to_fahrenheit,
+)
+from .crc import CRC16_TABLE, INIT
+
+REPLY_LENGTH = 25
+# Offset of d13 (wire index 0) in a reply, d1 is at 13
+REPLY_PAYLOAD_OFFSET = 11
+# d4 keeps its low bit out of the data, see _parse_info
+D4_INDEX = 5
+D4_MASK = 254
+
+_CELCIUS = tuple(raw_to_celcius(value) for value in range(32))
+_FAHRENHEIT = tuple(raw_to_fahrenheit(value) for value in range(32))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('skyworth.bulk requires numpy')
+
+
+def crc16_modbus_rows(frames) -> 'np.ndarray':
+    """CRC-16/MODBUS of every row of a 2-D uint8 array"""
+    _require_numpy()
+    table = np.array(CRC16_TABLE, dtype=np.uint16)
+    crc = np.full(frames.shape[0], INIT, dtype=np.uint16)
+    for column in frames.T:
+        crc = (crc >> 8) ^ table[(crc ^ column) & 0xff]
+    return crc
+
+
+def validate_frames(frames) -> 'np.ndarray':
+    """Rows holding a CRC-valid reply addressed to us"""
+    _require_numpy()
+    frames = np.asarray(frames, dtype=np.uint8)
+    width = frames.shape[1]
+    expected = (frames[:, -2].astype(np.uint16) << 8) | frames[:, -1]
+    return (
+        (frames[:, 0] == Datagram.HEADER)
+        & (frames[:, 1] == Datagram.HEADER)
+        & (frames[:, 3] == Datagram.DST_ADDRESS)
+        & (frames[:, 4] == width)
+        & (crc16_modbus_rows(frames[:, :-2]) == expected)
+    )
+
+
+def decode_frames(frames) -> dict:
+    """Decode an (N, 25) uint8 array of replies into columns
+
+    Returns:
+        dict: `valid` mask, `query`, `inner_temperature`,
+            `inner_temperature_float` and one column per decoded state
+            field (same names as _get_state). Columns of invalid rows are
+            meaningless.
+    """
+    _require_numpy()
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim != 2 or frames.shape[1] != REPLY_LENGTH:
+        raise ValueError(
+            'Expected an (N, %d) array, got %r' % (REPLY_LENGTH, frames.shape)
+        )
+
+    columns = {
+        'valid': validate_frames(frames),
+        'query': frames[:, 7].copy(),
+        'inner_temperature': frames[:, 10].copy(),
+        'inner_temperature_float': frames[:, 11].copy(),
+    }
+
+    payload = frames[:, REPLY_PAYLOAD_OFFSET:]
+    for field in STATE_FIELDS:
+        byte = payload[:, field.index]
+        if field.index == D4_INDEX:
+            byte = byte & D4_MASK
+        value = (byte & field.mask) >> field.shift
+        columns[field.name] = value == 1 if field.type is bool else value
+
+    raw = columns['temperature_set']
+    columns['temperature_set'] = np.where(
+        columns['temperature_mode'],
+        np.array(_FAHRENHEIT, dtype=np.uint8)[raw],
+        np.array(_CELCIUS, dtype=np.uint8)[raw],
+    )
+    return columns
+
+
+def frames_from_capture(reader, query: int = Query.TYPE_GET_INFO) -> 'np.ndarray':
+    """Stack the replies of a CaptureReader into an (N, 25) array
+
+    Only replies to `query` with the expected length are kept.
+    """
+    _require_numpy()
+    rows = [
+        record.response for record in reader
+        if len(record.request) > 7 and record.request[7] == query
+        and len(record.response) == REPLY_LENGTH
+    ]
+    if not rows:
+        return np.empty((0, REPLY_LENGTH), dtype=np.uint8)
+    return np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(-1, REPLY_LENGTH)
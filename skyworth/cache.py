@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from enum import IntEnum
+
+
+class CacheStatus(IntEnum):
+    MISS = 0
+    FRESH = 1
+    STALE = 2
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'writes': self.writes,
+        }
+
+    def __repr__(self) -> str:
+        return 'CacheStats(%s)' % ', '.join(
+            '%s=%d' % item for item in self.as_dict().items()
+        )
+
+
+class StateCache:
+    """Freshness bookkeeping of the state held by a model
+
+    The state itself lives in the controller data, the cache only knows
+    when it was last confirmed by the unit (a GET_INFO reply or one of our
+    own commands).
+
+    Args:
+        ttl (float, optional): Seconds during which the state is fresh
+        stale_ttl (float, optional): Extra seconds during which the stale
+            state is still served while it is refreshed in the background
+    """
+
+    def __init__(self, ttl: float = 1.0, stale_ttl: float = 0.0,
+                 clock=time.monotonic) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.stats = CacheStats()
+        self.timestamp = None
+        self.version = 0
+
+    def age(self) -> float:
+        if self.timestamp is None:
+            return float('inf')
+        return self.clock() - self.timestamp
+
+    def is_fresh(self) -> bool:
+        return self.age() <= self.ttl
+
+    def lookup(self) -> CacheStatus:
+        age = self.age()
+        if age <= self.ttl:
+            self.stats.hits += 1
+            return CacheStatus.FRESH
+        if age <= self.ttl + self.stale_ttl:
+            self.stats.stale_hits += 1
+            return CacheStatus.STALE
+        self.stats.misses += 1
+        return CacheStatus.MISS
+
+    def touch(self):
+        """The state has just been confirmed by the unit"""
+        self.timestamp = self.clock()
+        self.version += 1
+        self.stats.writes += 1
+
+    def invalidate(self):
+        self.timestamp = None
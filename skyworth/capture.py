@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Binary capture of controller exchanges and their deterministic replay
+
+File layout (little endian):
+    magic        8 bytes  b'SKYCAP\\x00\\x01'
+    records      repeated until the end of the file
+        timestamp_ns  int64   wall clock time of the request
+        duration_ns   uint32  time until the reply was received
+        request_len   uint16
+        response_len  uint16
+        request       request_len bytes
+        response      response_len bytes
+
+Records are appended with a single write, a truncated last record (crash
+while writing) is ignored by the reader.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b'SKYCAP\x00\x01'
+RECORD_HEADER = struct.Struct('<qIHH')
+# Offset of the query type in a frame
+QUERY_OFFSET = 7
+
+CaptureRecord = namedtuple(
+    'CaptureRecord', ('timestamp_ns', 'duration_ns', 'request', 'response')
+)
+
+
+class CaptureRecorder:
+    """Append request/response frames to a capture file
+
+    Attach it to a controller with `controller.recorder = recorder`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+        self.count = 0
+
+    def record(self, timestamp_ns: int, duration_ns: int, request, response):
+        record = RECORD_HEADER.pack(
+            timestamp_ns, min(duration_ns, 0xffffffff), len(request), len(response)
+        ) + bytes(request) + bytes(response)
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CaptureReader:
+    """Memory-mapped reader of a capture file
+
+    Request and response of the yielded records are memoryviews over the
+    mapping, valid until `close`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(MAGIC):
+            self._map = None
+            self._view = memoryview(b'')
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            if self._view[:len(MAGIC)] != MAGIC:
+                self.close()
+                raise ValueError('%s is not a capture file' % path)
+
+    def __iter__(self):
+        view = self._view
+        offset = len(MAGIC)
+        end = len(view)
+        while offset + RECORD_HEADER.size <= end:
+            timestamp_ns, duration_ns, request_len, response_len = \
+                RECORD_HEADER.unpack_from(view, offset)
+            start = offset + RECORD_HEADER.size
+            stop = start + request_len + response_len
+            if stop > end:
+                _logger.warning('Truncated record at offset %d ignored', offset)
+                return
+            yield CaptureRecord(
+                timestamp_ns,
+                duration_ns,
+                view[start:start + request_len],
+                view[start + request_len:stop],
+            )
+            offset = stop
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Records are still referenced, the mapping goes away with them
+                _logger.debug('Capture %s still in use, unmapped later', self.path)
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayTransport:
+    """Transport serving recorded responses instead of a unit
+
+    Responses are matched by query type and served in recorded order, so a
+    replay is deterministic. Use it in place of the ConnectionPool:
+    `AirConditionerController(host, transport=ReplayTransport(reader))`.
+
+    Args:
+        reader (CaptureReader): Capture to replay
+        speed (float, optional): None replays at maximum speed, otherwise
+            the recorded reply delays are divided by speed (1.0 = recorded)
+        loop (bool, optional): Restart from the first record once exhausted
+    """
+
+    def __init__(self, reader: CaptureReader, speed: float = None,
+                 loop: bool = False) -> None:
+        self.speed = speed
+        self.loop = loop
+        self._records = {}
+        for record in reader:
+            query = record.request[QUERY_OFFSET] if len(record.request) > QUERY_OFFSET else None
+            self._records.setdefault(query, []).append(
+                (record.duration_ns, bytes(record.response))
+            )
+        self._cursors = dict.fromkeys(self._records, 0)
+
+    def exchange(self, address, message, phases: dict = None) -> bytes:
+        # A replay has no connect/send/recv split, the controller only
+        # times the whole exchange
+        query = message[QUERY_OFFSET] if len(message) > QUERY_OFFSET else None
+        records = self._records.get(query)
+        if not records:
+            raise LookupError('No recorded response for query %r' % query)
+        cursor = self._cursors[query]
+        if cursor >= len(records):
+            if not self.loop:
+                raise EOFError('Capture exhausted for query %r' % query)
+            cursor = 0
+        self._cursors[query] = cursor + 1
+        duration_ns, response = records[cursor]
+        if self.speed:
+            time.sleep(duration_ns / 1e9 / self.speed)
+        return response
+
+    def stats(self, address=None):
+        return None
+
+    def rewind(self):
+        self._cursors = dict.fromkeys(self._records, 0)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Coalescing command queue of one unit
+
+Writes submitted while a frame is in flight or rate limited are merged:
+the last value of every field wins and all pending writes leave in a
+single command frame.
+
+    queue = CommandQueue(model, min_interval=0.25)
+    for value in (20, 21, 22, 23):
+        future = queue.submit('temperature_set', value)
+    await future  # one frame carrying 23
+
+Blocking callers use `submit_threadsafe`, which returns a
+concurrent.futures.Future resolved from the shared loop.
+"""
+
+import asyncio
+import logging
+
+from .ac_async import AsyncAirConditionerModel, get_shared_loop
+
+_logger = logging.getLogger(__name__)
+
+
+class CommandQueue:
+    """Per-unit queue merging writes into rate-limited command frames
+
+    Args:
+        model (AsyncAirConditionerModel): Model of the unit
+        min_interval (float, optional): Shortest time between two frames
+    """
+
+    def __init__(self, model: AsyncAirConditionerModel,
+                 min_interval: float = 0.25) -> None:
+        self.model = model
+        self.min_interval = min_interval
+        # field -> (value, [futures]), in the order of the latest writes
+        self._pending = {}
+        self._worker = None
+        self._last_sent = None
+        self.frames = 0
+        self.writes = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, field: str, value) -> asyncio.Future:
+        """Queue model.set_<field>(value), must run on the model loop
+
+        Returns:
+            asyncio.Future: Resolved with the value of the field actually
+                sent (a later write may have replaced this one) once the
+                unit acknowledged the frame
+        """
+        if not hasattr(self.model, 'set_' + field):
+            raise ValueError('Unknown field %r' % field)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Re-inserted so fields keep the order of their latest write
+        _, futures = self._pending.pop(field, (None, []))
+        futures.append(future)
+        self._pending[field] = (value, futures)
+        self.writes += 1
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        return future
+
+    def submit_threadsafe(self, field: str, value, loop=None):
+        """submit() from another thread, returns a concurrent Future"""
+        async def submit():
+            return await self.submit(field, value)
+
+        return asyncio.run_coroutine_threadsafe(
+            submit(), loop or get_shared_loop()
+        )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if self._last_sent is not None:
+                delay = self._last_sent + self.min_interval - loop.time()
+                if delay > 0:
+                    # Writes arriving meanwhile join this frame
+                    await asyncio.sleep(delay)
+            pending, self._pending = self._pending, {}
+            try:
+                async with self.model.batch():
+                    for field, (value, _) in pending.items():
+                        await getattr(self.model, 'set_' + field)(value)
+            except asyncio.CancelledError:
+                for _, futures in pending.values():
+                    for future in futures:
+                        future.cancel()
+                raise
+            except Exception as e:
+                _logger.warning('Command to %s failed: %r',
+                                self.model.controller.host, e)
+                for _, futures in pending.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+            else:
+                for value, futures in pending.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(value)
+            finally:
+                self._last_sent = loop.time()
+                self.frames += 1
+
+    async def flush(self):
+        """Wait until every queued write was sent"""
+        while self._worker is not None and not self._worker.done():
+            await asyncio.shield(self._worker)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        for _, futures in self._pending.values():
+            for future in futures:
+                future.cancel()
+        self._pending = {}
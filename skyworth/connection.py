@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import select
+import socket
+import threading
+import logging
+import time
+
+from .framing import BUFFER_SIZE, MAX_FRAME_LENGTH, FrameDecoder
+from . import metrics
+from .timing import add_phase
+
+_logger = logging.getLogger(__name__)
+
+# select.poll is missing on Windows
+_poll = getattr(select, 'poll', None)
+
+
+class PeerClosedError(ConnectionError):
+    """Raised when the unit closed its side of a pooled connection"""
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+        self.idle_evictions = 0
+
+    def saved_round_trips(self) -> int:
+        # Each reused connection saves one TCP handshake
+        return self.reuses
+
+    def as_dict(self) -> dict:
+        return {
+            'connects': self.connects,
+            'reuses': self.reuses,
+            'reconnects': self.reconnects,
+            'idle_evictions': self.idle_evictions,
+        }
+
+    def __repr__(self) -> str:
+        return 'PoolStats(%s)' % ', '.join(
+            '%s=%d' % item for item in self.as_dict().items()
+        )
+
+
+class ConnectionPool:
+    """Keep TCP connections to the units alive and reuse them
+
+    Idle connections are stored per (host, port). A connection that was
+    reset or half-closed by the unit is transparently replaced by a new
+    one and the exchange is retried once.
+
+    Args:
+        max_idle (int, optional): Idle connections kept per host.
+        idle_timeout (float, optional): Seconds before an idle connection
+            is evicted instead of reused.
+        timeout (float, optional): Socket timeout in seconds.
+        max_length (int, optional): Longest frame accepted from the units,
+            see FrameDecoder.
+    """
+
+    def __init__(
+        self,
+        max_idle: int = 2,
+        idle_timeout: float = 30.0,
+        timeout: float = 10.0,
+        max_length: int = MAX_FRAME_LENGTH,
+    ) -> None:
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_length = max_length
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._stats = {}
+
+    def _get_stats(self, address) -> PoolStats:
+        stats = self._stats.get(address)
+        if stats is None:
+            stats = self._stats.setdefault(address, PoolStats())
+        return stats
+
+    def stats(self, address=None) -> PoolStats:
+        """Return the stats of one (host, port) or the sum of all hosts"""
+        with self._lock:
+            if address is not None:
+                return self._get_stats(address)
+            total = PoolStats()
+            for stats in self._stats.values():
+                total.connects += stats.connects
+                total.reuses += stats.reuses
+                total.reconnects += stats.reconnects
+                total.idle_evictions += stats.idle_evictions
+            return total
+
+    def _connect(self, address, phases: dict = None):
+        if phases is not None:
+            start = time.monotonic_ns()
+            sock = socket.create_connection(address, timeout=self.timeout)
+            add_phase(phases, 'connect', start)
+        else:
+            sock = socket.create_connection(address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._get_stats(address).connects += 1
+        return sock, FrameDecoder(max_length=self.max_length)
+
+    @staticmethod
+    def _is_alive(sock: socket.socket) -> bool:
+        # A readable idle socket either has been closed by the peer (EOF)
+        # or holds unsolicited bytes, both make it unusable
+        try:
+            if _poll is not None:
+                # No FD_SETSIZE limit, select() fails on fds >= 1024
+                poller = _poll()
+                poller.register(sock, select.POLLIN)
+                return not poller.poll(0)
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _acquire(self, address, phases: dict = None):
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(address)
+            stats = self._get_stats(address)
+            while idle:
+                connection, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    stats.idle_evictions += 1
+                    connection[0].close()
+                elif not self._is_alive(connection[0]):
+                    stats.reconnects += 1
+                    connection[0].close()
+                else:
+                    stats.reuses += 1
+                    return connection, True
+        return self._connect(address, phases), False
+
+    def _release(self, address, connection):
+        with self._lock:
+            idle = self._idle.setdefault(address, [])
+            if len(idle) < self.max_idle:
+                idle.append((connection, time.monotonic()))
+                return
+        connection[0].close()
+
+    @staticmethod
+    def _transfer(connection, message, phases: dict = None) -> bytes:
+        sock, decoder = connection
+        # Whatever is left from a previous exchange is stale
+        decoder.clear()
+        if phases is not None:
+            start = time.monotonic_ns()
+            sock.sendall(message)
+            sent = add_phase(phases, 'send', start)
+            data = ConnectionPool._receive(decoder, sock)
+            add_phase(phases, 'recv', sent)
+            return data
+        sock.sendall(message)
+        return ConnectionPool._receive(decoder, sock)
+
+    @staticmethod
+    def _receive(decoder: FrameDecoder, sock: socket.socket) -> bytes:
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                # The decoder buffer is reused once the connection is released
+                return bytes(frame)
+            if not decoder.read_from(sock, BUFFER_SIZE):
+                raise PeerClosedError('Connection closed by peer')
+
+    def exchange(self, address, message, phases: dict = None) -> bytes:
+        """Send one frame to address and return the raw reply
+
+        Args:
+            address (tuple): (host, port) of the unit
+            message (bytes): Frame to send
+            phases (dict, optional): Filled with the connect, send and recv
+                times in nanoseconds, see skyworth.timing
+
+        Returns:
+            bytes: First complete frame of the reply, empty if the unit
+                closed without answering
+        """
+        registry = metrics.REGISTRY
+        if registry is not None and phases is None:
+            phases = {}
+        try:
+            return self._exchange(address, message, phases)
+        finally:
+            if registry is not None:
+                registry.device(address).observe(phases)
+
+    def _exchange(self, address, message, phases) -> bytes:
+        connection, reused = self._acquire(address, phases)
+        try:
+            try:
+                data = self._transfer(connection, message, phases)
+            except (PeerClosedError, ConnectionResetError, BrokenPipeError,
+                    ConnectionAbortedError):
+                connection[0].close()
+                if not reused:
+                    raise
+                _logger.debug('Pooled connection to %s lost, reconnecting', address)
+                with self._lock:
+                    self._get_stats(address).reconnects += 1
+                connection = self._connect(address, phases)
+                data = self._transfer(connection, message, phases)
+        except PeerClosedError:
+            connection[0].close()
+            return b''
+        except BaseException:
+            connection[0].close()
+            raise
+        self._release(address, connection)
+        return data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection[0].close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> ConnectionPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
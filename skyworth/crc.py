@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import struct
+
+# CRC-16/MODBUS: reflected polynomial 0x8005, init 0xffff, no final xor
+POLYNOMIAL = 0xa001
+INIT = 0xffff
+
+
+def _make_table() -> tuple:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ POLYNOMIAL
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _make_table()
+
+try:
+    # crcmod C extension, same algorithm with a packed table
+    from crcmod._crcfunext import _crc16r as _ext_crc16r
+    _EXT_TABLE = struct.pack('256H', *CRC16_TABLE)
+except ImportError:
+    _ext_crc16r = None
+    _EXT_TABLE = None
+
+
+def _py_crc16_modbus(data, crc: int = INIT) -> int:
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xff]
+    return crc
+
+
+def _ext_crc16_modbus(data, crc: int = INIT) -> int:
+    return _ext_crc16r(data, crc, _EXT_TABLE)
+
+
+# bytes, bytearray and memoryview are read in place by both implementations
+crc16_modbus = _ext_crc16_modbus if _ext_crc16r is not None else _py_crc16_modbus
+
+
+def crc_bytes(crc: int) -> list:
+    # Frames carry the CRC high byte first
+    return [(crc >> 8) & 0xff, crc & 0xff]
+
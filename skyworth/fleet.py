@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import time
+
+from .ac_async import (
+    AsyncAirConditionerController,
+    AsyncAirConditionerModel,
+    run_sync,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+class FleetResult:
+    def __init__(self, address, value=None, error: BaseException = None,
+                 elapsed: float = 0.0) -> None:
+        self.address = address
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return 'FleetResult(%s:%d, %r)' % (*self.address, self.value)
+        return 'FleetResult(%s:%d, error=%r)' % (*self.address, self.error)
+
+
+class AirConditionerFleet:
+    """Poll and control many units concurrently
+
+    Every unit gets its own AsyncAirConditionerController, at most
+    `concurrency` exchanges are in flight at the same time. Errors are
+    returned per unit instead of aborting the whole sweep.
+
+    Args:
+        addresses (iterable): Hosts or (host, port) tuples
+        port (int, optional): Port used for bare hosts
+        concurrency (int, optional): Maximum number of units queried at once
+        timeout (float, optional): Per exchange timeout in seconds
+    """
+
+    def __init__(
+        self,
+        addresses,
+        port: int = 1998,
+        concurrency: int = 64,
+        timeout: float = 10.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.models = {}
+        self._semaphores = {}
+        for address in addresses:
+            if isinstance(address, str):
+                address = (address, port)
+            self.add(*address)
+
+    def add(self, host: str, port: int = 1998) -> AsyncAirConditionerModel:
+        controller = AsyncAirConditionerController(host, port, self.timeout)
+        model = AsyncAirConditionerModel(controller)
+        self.models[(host, port)] = model
+        return model
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def __iter__(self):
+        return iter(self.models.items())
+
+    async def _run(self, address, function):
+        # One limit per event loop, so sync and async callers can mix
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                value = await function(self.models[address])
+            except Exception as e:
+                _logger.warning('%s:%d failed: %r', *address, e)
+                return FleetResult(address, error=e,
+                                   elapsed=time.monotonic() - start)
+            return FleetResult(address, value, elapsed=time.monotonic() - start)
+
+    async def async_map(self, function, addresses=None) -> dict:
+        """Await function(model) for every unit
+
+        Returns:
+            dict: FleetResult per (host, port)
+        """
+        if addresses is None:
+            addresses = list(self.models)
+        results = await asyncio.gather(
+            *(self._run(address, function) for address in addresses)
+        )
+        return {result.address: result for result in results}
+
+    async def async_update_state(self, addresses=None) -> dict:
+        async def update_state(model: AsyncAirConditionerModel):
+            await model.update_state()
+            return model.controller._get_state()
+
+        return await self.async_map(update_state, addresses)
+
+    async def async_set(self, field: str, value, addresses=None) -> dict:
+        """Call model.set_<field>(value) on every unit"""
+        async def set_field(model: AsyncAirConditionerModel):
+            await getattr(model, 'set_' + field)(value)
+            return model.controller._get_state()
+
+        return await self.async_map(set_field, addresses)
+
+    async def async_close(self):
+        await asyncio.gather(
+            *(model.controller.close() for model in self.models.values())
+        )
+        self._semaphores.pop(asyncio.get_running_loop(), None)
+
+    def update_state(self, addresses=None) -> dict:
+        return run_sync(self.async_update_state(addresses))
+
+    def set(self, field: str, value, addresses=None) -> dict:
+        return run_sync(self.async_set(field, value, addresses))
+
+    def close(self):
+        run_sync(self.async_close())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+from .crc import crc16_modbus
+
+_logger = logging.getLogger(__name__)
+
+HEADER = b'\x7a\x7a'
+LENGTH_OFFSET = 4
+# Header (10 bytes) + CRC (2 bytes), frames cannot be shorter
+MIN_FRAME_LENGTH = 12
+# Replies (25 bytes) are the longest frames of the protocol, a longer
+# LENGTH comes from a 0x7a 0x7a found in noise
+MAX_FRAME_LENGTH = 25
+BUFFER_SIZE = 1024
+
+
+class FrameDecoder:
+    """Incremental decoder splitting a byte stream into frames
+
+    Bytes are accumulated in a preallocated buffer, either copied by
+    `feed` or received in place by `read_from`. `frames` resyncs on the
+    0x7a 0x7a header, waits for the LENGTH byte and yields each complete
+    frame as a memoryview over the buffer.
+
+    A header with an implausible LENGTH, or whose frame fails its CRC
+    while another header (or a 0x7a on its last byte) starts inside it,
+    is taken for noise and the search resumes one byte further. A
+    corrupted frame with no header inside is still yielded, its CRC is
+    checked by the parser.
+
+    Args:
+        size (int, optional): Initial buffer size, it grows when needed
+        max_length (int, optional): Longest LENGTH accepted, raise it for
+            units sending frames longer than the 25 bytes replies
+
+    Yielded views are only valid until the next `feed`/`read_from` call,
+    copy them if they must outlive it.
+    """
+
+    def __init__(self, size: int = BUFFER_SIZE,
+                 max_length: int = MAX_FRAME_LENGTH) -> None:
+        self.max_length = max_length
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+
+    def _reserve(self, size: int):
+        if self._end + size <= len(self._buffer):
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buffer):
+            # Move the pending bytes to the front, no reallocation
+            self._buffer[:pending] = self._view[self._start:self._end]
+        else:
+            buffer = bytearray(max(2 * len(self._buffer), pending + size))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        self._start = 0
+        self._end = pending
+
+    def feed(self, data):
+        size = len(data)
+        self._reserve(size)
+        self._view[self._end:self._end + size] = data
+        self._end += size
+
+    def read_from(self, sock, size: int = BUFFER_SIZE) -> int:
+        """Receive directly into the buffer
+
+        Returns:
+            int: Number of bytes received, 0 when the peer closed
+        """
+        self._reserve(size)
+        count = sock.recv_into(self._view[self._end:], size)
+        self._end += count
+        return count
+
+    def frames(self):
+        buffer = self._buffer
+        while True:
+            index = buffer.find(HEADER, self._start, self._end)
+            if index < 0:
+                # Keep a trailing 0x7a, it may be the first header byte
+                if self._end > self._start and buffer[self._end - 1] == HEADER[0]:
+                    self._start = self._end - 1
+                else:
+                    self._start = self._end
+                return
+            # In a run of 0x7a bytes the header is made of the last two
+            while index + 2 < self._end and buffer[index + 2] == HEADER[0]:
+                index += 1
+            if index != self._start:
+                _logger.debug('Skipped %d bytes before header', index - self._start)
+                self._start = index
+            if self._end - index <= LENGTH_OFFSET:
+                return
+            length = buffer[index + LENGTH_OFFSET]
+            if not MIN_FRAME_LENGTH <= length <= self.max_length:
+                _logger.debug('Invalid frame length %d, resync', length)
+                self._start = index + 1
+                continue
+            if self._end - index < length:
+                return
+            end = index + length
+            if crc16_modbus(self._view[index:end - 2]) != \
+                    (buffer[end - 2] << 8) | buffer[end - 1] and (
+                        buffer.find(HEADER, index + 2, end) >= 0
+                        # A run of 0x7a starting on the last byte
+                        or buffer[end - 1] == HEADER[0]):
+                _logger.debug('Invalid CRC before another header, resync')
+                self._start = index + 1
+                continue
+            self._start = end
+            yield self._view[index:end]
+
+    def __iter__(self):
+        return self.frames()
+
+    def next_frame(self):
+        """Return the first complete frame or None"""
+        for frame in self.frames():
+            return frame
+        return None
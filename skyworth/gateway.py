@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Local HTTP/JSON gateway in front of many units
+
+    python -m skyworth.gateway --port 8080 192.168.1.20 192.168.1.21:1998
+
+`--metrics-port 9464` also serves Prometheus metrics on /metrics.
+
+    GET  /units                 state of every unit
+    GET  /units/<host>:<port>   state of one unit
+    POST /units/<host>:<port>   {"mode": "COOL", "temperature_set": 22}
+
+Reads never reach the units: a PollingScheduler is the only reader of
+every unit and requests are served from the model state. Writes go
+through a CommandQueue per unit, so commands to the same unit are
+serialized (and coalesced) while different units run concurrently.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+
+from .ac_model import (
+    ControlAction,
+    ModeAction,
+    SpeedAction,
+    SwingAction,
+    TemperatureMode,
+)
+from .command_queue import CommandQueue
+from .fleet import AirConditionerFleet
+from .metrics import MetricsExporter, enable as enable_metrics
+from .scheduler import PollingScheduler
+
+_logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 8192
+MAX_BODY_SIZE = 65536
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    502: 'Bad Gateway',
+}
+
+
+def _control_action(value) -> ControlAction:
+    if isinstance(value, str):
+        return ControlAction[value.upper()]
+    return ControlAction.from_bool(value)
+
+
+def _enum(enum):
+    def parse(value):
+        if isinstance(value, str):
+            return enum[value.upper()]
+        return enum(value)
+
+    return parse
+
+
+# Writable fields and the parser of their JSON value
+FIELDS = {
+    'power': _control_action,
+    'mute': _control_action,
+    'sleep': _control_action,
+    'filter_pm': _control_action,
+    'energy_saving': _control_action,
+    'turbo': _control_action,
+    'light': _control_action,
+    'swing': _enum(SwingAction),
+    'mode': _enum(ModeAction),
+    'speed': _enum(SpeedAction),
+    'temperature_mode': _enum(TemperatureMode),
+    'temperature_set': int,
+}
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Gateway:
+    """HTTP/JSON front end of a fleet
+
+    Args:
+        addresses (iterable): Hosts or (host, port) tuples of the units
+        host (str, optional): Address to listen on
+        port (int, optional): Port to listen on, 0 picks a free one
+        interval (float, optional): Starting poll interval of a unit
+        min_interval (float, optional): Poll interval of a changing unit
+        max_interval (float, optional): Poll interval of a stable unit
+        command_interval (float, optional): Shortest time between two
+            command frames to the same unit
+        rate (float, optional): Fleet-wide polls per second
+    """
+
+    def __init__(self, addresses, host: str = '127.0.0.1', port: int = 8080,
+                 interval: float = 10.0, min_interval: float = 2.0,
+                 max_interval: float = 60.0, command_interval: float = 0.25,
+                 rate: float = 20.0) -> None:
+        self.host = host
+        self.port = port
+        self.fleet = AirConditionerFleet(addresses)
+        self.scheduler = PollingScheduler(
+            self.fleet, interval=interval, min_interval=min_interval,
+            max_interval=max_interval, rate=rate,
+        )
+        self.queues = {}
+        for address, model in self.fleet:
+            # The poller keeps the state fresh enough to write over it
+            model.write_ttl = max(model.write_ttl, max_interval)
+            self.queues[address] = CommandQueue(model, command_interval)
+        # Encoded state per unit, reused while the data is unchanged
+        self._encoded = {}
+        self._warming = {}
+        self._server = None
+        self._poller = None
+        self.requests = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._poller = asyncio.ensure_future(self.scheduler.run())
+        _logger.info('Gateway for %d units on http://%s:%d',
+                     len(self.fleet), self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._poller is not None:
+            self.scheduler.stop()
+            await self._poller
+            self._poller = None
+        for queue in self.queues.values():
+            await queue.close()
+        await self.fleet.async_close()
+
+    def _address(self, name: str):
+        host, _, port = name.rpartition(':')
+        try:
+            address = (host, int(port))
+        except ValueError:
+            address = None
+        if address not in self.fleet.models:
+            raise HttpError(404, 'Unknown unit %s' % name)
+        return address
+
+    async def _warm_up(self, address):
+        """Query a unit never polled yet, once for all waiting clients"""
+        model = self.fleet.models[address]
+        if model.cache.timestamp is not None:
+            return
+        task = self._warming.get(address)
+        if task is None:
+            task = self._warming[address] = asyncio.ensure_future(
+                self.fleet.async_map(
+                    lambda model: model.refresh(force=True), [address]
+                )
+            )
+            task.add_done_callback(lambda _: self._warming.pop(address, None))
+        await asyncio.shield(task)
+
+    def _unit_state(self, address) -> bytes:
+        model = self.fleet.models[address]
+        controller = model.controller
+        key = (controller.data.version, model.cache.version)
+        cached = self._encoded.get(address)
+        if cached is not None and cached[0] == key:
+            encoded = cached[1]
+        else:
+            encoded = _dumps({
+                'state': controller._get_state()
+                if model.cache.timestamp is not None else None,
+                'inner_temperature': controller.inner_temperature,
+                'inner_temperature_float': controller.inner_temperature_float,
+            })
+            self._encoded[address] = (key, encoded)
+        # Only the age changes between two polls
+        age = model.cache.age()
+        age = b'null' if math.isinf(age) else b'%.3f' % age
+        return b'{"unit":"%s:%d","age":%s,%s' % (
+            address[0].encode(), address[1], age, encoded[1:]
+        )
+
+    async def _get_all(self) -> bytes:
+        await asyncio.gather(*(self._warm_up(address) for address in self.fleet.models))
+        return b'[' + b','.join(
+            self._unit_state(address) for address in self.fleet.models
+        ) + b']'
+
+    async def _get(self, address) -> bytes:
+        await self._warm_up(address)
+        return self._unit_state(address)
+
+    async def _post(self, address, body: bytes) -> bytes:
+        try:
+            changes = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(400, 'Invalid JSON')
+        if not isinstance(changes, dict):
+            raise HttpError(400, 'Expected a JSON object')
+        values = {}
+        for field, value in changes.items():
+            parse = FIELDS.get(field)
+            if parse is None:
+                raise HttpError(400, 'Unknown field %s' % field)
+            try:
+                values[field] = parse(value)
+            except (KeyError, ValueError, TypeError):
+                raise HttpError(400, 'Invalid value for %s' % field)
+        await self._warm_up(address)
+        queue = self.queues[address]
+        futures = [queue.submit(field, value) for field, value in values.items()]
+        # Every outcome is retrieved, the writes of one frame fail together
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, (OSError, asyncio.TimeoutError)):
+                raise HttpError(502, 'Unit unreachable: %r' % result)
+            if isinstance(result, BaseException):
+                raise result
+        return self._unit_state(address)
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> bytes:
+        path = path.split('?', 1)[0].rstrip('/')
+        if path == '/units':
+            if method != 'GET':
+                raise HttpError(405, 'GET only')
+            return await self._get_all()
+        if path.startswith('/units/'):
+            address = self._address(path[len('/units/'):])
+            if method == 'GET':
+                return await self._get(address)
+            if method == 'POST':
+                return await self._post(address, body)
+            raise HttpError(405, 'GET or POST only')
+        if path == '/health':
+            return b'{"status":"ok"}'
+        raise HttpError(404, 'Not found')
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, b'', False)
+                    return
+                if len(head) > MAX_HEADER_SIZE:
+                    await self._respond(writer, 413, b'', False)
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = lines[0].split(' ')
+                except ValueError:
+                    await self._respond(writer, 400, b'', False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (
+                    version == 'HTTP/1.1'
+                    and headers.get('connection', '').lower() != 'close'
+                )
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, b'', False)
+                    return
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, b'', False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests += 1
+                try:
+                    payload = await self._dispatch(method, path, body)
+                    status = 200
+                except HttpError as e:
+                    status = e.status
+                    payload = _dumps({'error': str(e)})
+                except Exception as e:
+                    _logger.exception('%s %s failed', method, path)
+                    status = 502
+                    payload = _dumps({'error': repr(e)})
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int,
+                       payload: bytes, keep_alive: bool):
+        writer.write(
+            b'HTTP/1.1 %d %s\r\n'
+            b'Content-Type: application/json\r\n'
+            b'Content-Length: %d\r\n'
+            b'Connection: %s\r\n\r\n' % (
+                status, REASONS.get(status, '').encode(), len(payload),
+                b'keep-alive' if keep_alive else b'close',
+            ) + payload
+        )
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP/JSON gateway for Skyworth units')
+    parser.add_argument('units', nargs='+', help='host or host:port')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='starting poll interval in seconds')
+    parser.add_argument('--rate', type=float, default=20.0,
+                        help='fleet-wide polls per second')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve Prometheus metrics on this port')
+    args = parser.parse_args(argv)
+
+    addresses = []
+    for unit in args.units:
+        host, _, port = unit.rpartition(':')
+        addresses.append((host, int(port)) if host else (unit, 1998))
+
+    logging.basicConfig(level=logging.INFO)
+    gateway = Gateway(
+        addresses, args.host, args.port, interval=args.interval, rate=args.rate
+    )
+
+    exporter = None
+    if args.metrics_port is not None:
+        registry = enable_metrics()
+        for _, model in gateway.fleet:
+            registry.track(model)
+        exporter = MetricsExporter(registry, args.host, args.metrics_port)
+
+    async def serve():
+        if exporter is not None:
+            await exporter.start()
+        try:
+            await gateway.serve_forever()
+        finally:
+            if exporter is not None:
+                await exporter.close()
+            await gateway.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Per-unit metrics in the Prometheus text exposition format
+
+    registry = metrics.enable()
+    registry.track(model)
+    exporter = MetricsExporter(registry, port=9464).start_in_thread()
+
+Instrumented code only checks `metrics.REGISTRY` while it is None, so
+the exchanges pay nothing until metrics are enabled. Latencies are fed
+from the phases of skyworth.timing.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+from bisect import bisect_left
+
+_logger = logging.getLogger(__name__)
+
+# Set by enable(), checked by the instrumented code
+REGISTRY = None
+
+# Seconds, from a loopback exchange to a unit timing out
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # Last slot counts the values above every bucket (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_ns(self, value: int):
+        self.observe(value / 1e9)
+
+
+class DeviceMetrics:
+    """Measurements of one (host, port)"""
+
+    __slots__ = ('connect', 'send', 'recv', 'crc_failures', 'commands',
+                 'infos')
+
+    def __init__(self) -> None:
+        self.connect = Histogram()
+        self.send = Histogram()
+        self.recv = Histogram()
+        self.crc_failures = 0
+        self.commands = 0
+        self.infos = 0
+
+    def observe(self, phases: dict):
+        """Record the connect, send and recv times of an exchange"""
+        for name in ('connect', 'send', 'recv'):
+            value = phases.get(name)
+            if value is not None:
+                getattr(self, name).observe_ns(value)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.devices = {}
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def device(self, address) -> DeviceMetrics:
+        device = self.devices.get(address)
+        if device is None:
+            with self._lock:
+                device = self.devices.setdefault(address, DeviceMetrics())
+        return device
+
+    def track(self, model):
+        """Export the cache and decoded state of a model"""
+        controller = model.controller
+        self.models[(controller.host, controller.port)] = model
+
+    def untrack(self, model):
+        controller = model.controller
+        self.models.pop((controller.host, controller.port), None)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format"""
+        lines = []
+        devices = sorted(self.devices.items())
+        for name, attribute, help in (
+            ('connect', 'connect', 'TCP connect time'),
+            ('send', 'send', 'Time to hand a frame to the socket'),
+            ('recv', 'recv', 'Time from sent frame to complete reply'),
+        ):
+            metric = 'skyworth_%s_seconds' % name
+            lines.append('# HELP %s %s' % (metric, help))
+            lines.append('# TYPE %s histogram' % metric)
+            for address, device in devices:
+                _render_histogram(
+                    lines, metric, _unit(address), getattr(device, attribute)
+                )
+
+        for name, attribute, help in (
+            ('crc_failures', 'crc_failures', 'Replies with an invalid CRC'),
+            ('commands', 'commands', 'TYPE_COMMAND frames sent'),
+            ('info_requests', 'infos', 'TYPE_GET_INFO frames sent'),
+        ):
+            metric = 'skyworth_%s_total' % name
+            lines.append('# HELP %s %s' % (metric, help))
+            lines.append('# TYPE %s counter' % metric)
+            for address, device in devices:
+                lines.append('%s{unit="%s"} %d' % (
+                    metric, _unit(address), getattr(device, attribute)
+                ))
+
+        models = sorted(self.models.items())
+        if models:
+            _render_models(lines, models)
+        return '\n'.join(lines) + '\n'
+
+
+def _unit(address) -> str:
+    return '%s:%d' % address
+
+
+def _render_histogram(lines: list, metric: str, unit: str, histogram: Histogram):
+    cumulative = 0
+    for bucket, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append('%s_bucket{unit="%s",le="%g"} %d' % (
+            metric, unit, bucket, cumulative
+        ))
+    lines.append('%s_bucket{unit="%s",le="+Inf"} %d' % (
+        metric, unit, histogram.count
+    ))
+    lines.append('%s_sum{unit="%s"} %.9f' % (metric, unit, histogram.sum))
+    lines.append('%s_count{unit="%s"} %d' % (metric, unit, histogram.count))
+
+
+def _render_models(lines: list, models: list):
+    lines.append('# HELP skyworth_cache_hit_ratio Reads served from the state cache')
+    lines.append('# TYPE skyworth_cache_hit_ratio gauge')
+    for address, model in models:
+        lines.append('skyworth_cache_hit_ratio{unit="%s"} %.6f' % (
+            _unit(address), model.cache.stats.hit_ratio
+        ))
+    lines.append('# HELP skyworth_cache_lookups_total State cache lookups')
+    lines.append('# TYPE skyworth_cache_lookups_total counter')
+    for address, model in models:
+        stats = model.cache.stats
+        for result, count in (('hit', stats.hits), ('stale', stats.stale_hits),
+                              ('miss', stats.misses)):
+            lines.append('skyworth_cache_lookups_total{unit="%s",result="%s"} %d' % (
+                _unit(address), result, count
+            ))
+    lines.append('# HELP skyworth_state_age_seconds Age of the confirmed state')
+    lines.append('# TYPE skyworth_state_age_seconds gauge')
+    for address, model in models:
+        age = model.cache.age()
+        lines.append('skyworth_state_age_seconds{unit="%s"} %s' % (
+            _unit(address), '+Inf' if math.isinf(age) else '%.3f' % age
+        ))
+    lines.append('# HELP skyworth_inner_temperature_celsius Room temperature')
+    lines.append('# TYPE skyworth_inner_temperature_celsius gauge')
+    for address, model in models:
+        temperature = model.controller.inner_temperature
+        if temperature is not None:
+            lines.append('skyworth_inner_temperature_celsius{unit="%s"} %d' % (
+                _unit(address), temperature
+            ))
+    lines.append('# HELP skyworth_state Last decoded state field')
+    lines.append('# TYPE skyworth_state gauge')
+    for address, model in models:
+        if model.cache.timestamp is None:
+            continue
+        for field, value in model.controller._get_state().items():
+            lines.append('skyworth_state{unit="%s",field="%s"} %d' % (
+                _unit(address), field, value
+            ))
+
+
+def enable(registry: MetricsRegistry = None) -> MetricsRegistry:
+    """Start collecting into registry (a new one by default)"""
+    global REGISTRY
+    REGISTRY = registry if registry is not None else MetricsRegistry()
+    return REGISTRY
+
+
+def disable():
+    global REGISTRY
+    REGISTRY = None
+
+
+class MetricsExporter:
+    """Serve GET /metrics over HTTP
+
+    Args:
+        registry (MetricsRegistry): Registry to render
+        host (str, optional): Address to listen on
+        port (int, optional): Port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1',
+                 port: int = 9464) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request = head.split(b'\r\n', 1)[0].split(b' ')
+            if len(request) == 3 and request[0] == b'GET' and \
+                    request[1].split(b'?')[0] == b'/metrics':
+                status, body = b'200 OK', self.registry.render().encode()
+            else:
+                status, body = b'404 Not Found', b''
+            writer.write(
+                b'HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n'
+                b'Connection: close\r\n\r\n' % (
+                    status, CONTENT_TYPE.encode(), len(body)
+                ) + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def start_in_thread(self):
+        """Serve from a daemon thread, for blocking programs"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='skyworth-metrics', daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), self._loop).result()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Adaptive GET_INFO polling of a fleet
+
+Every unit has its own interval: it shrinks while the unit reports new
+states and grows while it stays stable. Unreachable units back off
+exponentially, start times and intervals are jittered so units are not
+queried in lockstep, and a token bucket caps the request rate of the
+whole fleet.
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+
+from .ac_async import run_sync
+from .fleet import AirConditionerFleet
+
+_logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_EXPONENT = 32
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts of `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = None
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._refill(loop.time())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DeviceSchedule:
+    """Polling state of one unit"""
+
+    __slots__ = ('address', 'interval', 'due', 'failures', 'polls', 'changes')
+
+    def __init__(self, address, interval: float, due: float) -> None:
+        self.address = address
+        self.interval = interval
+        self.due = due
+        self.failures = 0
+        self.polls = 0
+        self.changes = 0
+
+    def __repr__(self) -> str:
+        return 'DeviceSchedule(%s:%d, interval=%.1f, failures=%d)' % (
+            *self.address, self.interval, self.failures
+        )
+
+
+class PollingScheduler:
+    """Poll the units of a fleet with per-unit adaptive intervals
+
+    Polls go through model.refresh(force=True), so the model cache and
+    its subscriptions are fed as with any other query.
+
+    Args:
+        fleet (AirConditionerFleet): Units to poll, hosts are accepted too
+        interval (float, optional): Starting interval of every unit
+        min_interval (float, optional): Interval while the state changes
+        max_interval (float, optional): Interval of a stable unit
+        shrink (float, optional): Interval factor after a change
+        grow (float, optional): Interval factor after an unchanged reply
+        max_backoff (float, optional): Longest delay between two attempts
+            on an unreachable unit
+        jitter (float, optional): Relative random spread of every delay
+        rate (float, optional): Fleet-wide requests per second, None for
+            no limit
+        burst (int, optional): Requests allowed at once by the rate limit
+        callback (callable, optional): Called with (schedule, result) after
+            every poll, result being the FleetResult of the unit
+    """
+
+    def __init__(
+        self,
+        fleet,
+        interval: float = 10.0,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0,
+        shrink: float = 0.5,
+        grow: float = 1.5,
+        max_backoff: float = 300.0,
+        jitter: float = 0.1,
+        rate: float = 20.0,
+        burst: int = 10,
+        callback=None,
+    ) -> None:
+        if not isinstance(fleet, AirConditionerFleet):
+            fleet = AirConditionerFleet(fleet)
+        self.fleet = fleet
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.shrink = shrink
+        self.grow = grow
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.callback = callback
+        self.schedules = {}
+        self._queue = []
+        self._wakeup = None
+        self._loop = None
+        self._stopped = False
+
+    def _jittered(self, delay: float) -> float:
+        if not self.jitter:
+            return delay
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, schedule: DeviceSchedule):
+        heapq.heappush(self._queue, (schedule.due, id(schedule), schedule))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _reschedule(self, schedule: DeviceSchedule, result, changed: bool,
+                    now: float):
+        schedule.polls += 1
+        if not result.ok:
+            schedule.failures += 1
+            # Full jitter, unreachable units spread out instead of
+            # retrying together
+            # The exponent is clamped, 2.0 ** 1024 overflows and the
+            # cap is reached long before
+            delay = random.uniform(0, min(
+                self.max_backoff,
+                self.interval * 2.0 ** min(schedule.failures, MAX_BACKOFF_EXPONENT)
+            ))
+        else:
+            schedule.failures = 0
+            if changed:
+                schedule.changes += 1
+                schedule.interval = max(
+                    self.min_interval, schedule.interval * self.shrink
+                )
+            else:
+                schedule.interval = min(
+                    self.max_interval, schedule.interval * self.grow
+                )
+            delay = self._jittered(schedule.interval)
+        schedule.due = now + delay
+
+    async def _poll(self, schedule: DeviceSchedule):
+        model = self.fleet.models.get(schedule.address)
+        if model is None:
+            # Removed from the fleet
+            self.schedules.pop(schedule.address, None)
+            return
+        before = model.controller.data.snapshot()
+
+        async def refresh(model):
+            await model.refresh(force=True)
+
+        results = await self.fleet.async_map(refresh, [schedule.address])
+        result = results[schedule.address]
+        changed = model.controller.data.snapshot() != before
+        self._reschedule(
+            schedule, result, changed, asyncio.get_running_loop().time()
+        )
+        if self.callback is not None:
+            try:
+                self.callback(schedule, result)
+            except Exception:
+                _logger.exception('Scheduler callback failed')
+        if not self._stopped:
+            self._push(schedule)
+
+    def _add_new_units(self, now: float):
+        for address in self.fleet.models:
+            if address not in self.schedules:
+                # Spread the first polls over one interval
+                schedule = DeviceSchedule(
+                    address, self.interval, now + random.uniform(0, self.interval)
+                )
+                self.schedules[address] = schedule
+                self._push(schedule)
+
+    async def run(self):
+        """Poll until stop() is called"""
+        loop = self._loop = asyncio.get_running_loop()
+        self._stopped = False
+        self._wakeup = asyncio.Event()
+        self._queue = []
+        self.schedules = {}
+        tasks = set()
+        try:
+            while not self._stopped:
+                now = loop.time()
+                self._add_new_units(now)
+                if not self._queue:
+                    delay = self.interval
+                else:
+                    delay = self._queue[0][0] - now
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                _, _, schedule = heapq.heappop(self._queue)
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+                task = asyncio.ensure_future(self._poll(schedule))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self._wakeup = None
+            self._loop = None
+
+    def stop(self):
+        """Stop run(), may be called from any thread"""
+        self._stopped = True
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def run_sync(self):
+        run_sync(self.run())
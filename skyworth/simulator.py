@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Stand-in for Skyworth units speaking the controller protocol
+
+Every VirtualUnit listens on its own TCP port, answers TYPE_GET_INFO with
+its state and applies the payload of TYPE_COMMAND frames. All units of a
+Simulator share one asyncio loop, so a single process can host thousands
+of them.
+
+    python -m skyworth.simulator --port 1998 --count 100 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import threading
+
+from .ac_controller import Datagram, Query
+from .crc import crc16_modbus
+from .framing import FrameDecoder
+
+_logger = logging.getLogger(__name__)
+
+REPLY_LENGTH = 25
+# Offsets in frames
+QUERY_OFFSET = 7
+COMMAND_STATE_OFFSET = 12
+REPLY_STATE_OFFSET = 13
+STATE_SIZE = 10
+
+PROTOCOL_VERSION = 0x01
+MOTHERBOARD_VERSION = 0x02
+
+
+class VirtualUnit:
+    """State of one simulated unit
+
+    Args:
+        port (int, optional): Port to listen on, 0 picks a free one
+        inner_temperature (int, optional): Reported room temperature
+        latency (float, optional): Seconds before each reply
+        jitter (float, optional): Random +/- seconds added to the latency
+    """
+
+    def __init__(self, port: int = 0, inner_temperature: int = 24,
+                 latency: float = 0.0, jitter: float = 0.0) -> None:
+        self.port = port
+        self.inner_temperature = inner_temperature
+        self.inner_temperature_float = 0
+        self.latency = latency
+        self.jitter = jitter
+        # d1..d10, same defaults as AirConditionerController._reset_data
+        self.state = bytearray(STATE_SIZE)
+        self.state[3] = 0x84
+        self.commands = 0
+        self.requests = 0
+        self.server = None
+
+    def reply(self, query: int) -> bytes:
+        frame = bytearray(REPLY_LENGTH)
+        frame[0] = frame[1] = Datagram.HEADER
+        frame[2] = Datagram.SRC_ADDRESS
+        frame[3] = Datagram.DST_ADDRESS
+        frame[4] = REPLY_LENGTH
+        frame[5] = Datagram.AC_ID1
+        frame[6] = Datagram.AC_ID2
+        frame[QUERY_OFFSET] = query
+        frame[8] = PROTOCOL_VERSION
+        frame[9] = MOTHERBOARD_VERSION
+        frame[10] = self.inner_temperature & 0xff
+        frame[11] = self.inner_temperature_float & 0xff
+        frame[REPLY_STATE_OFFSET:REPLY_STATE_OFFSET + STATE_SIZE] = self.state
+        crc16 = crc16_modbus(memoryview(frame)[:-2])
+        frame[-2] = (crc16 >> 8) & 0xff
+        frame[-1] = crc16 & 0xff
+        return bytes(frame)
+
+    def handle(self, frame) -> bytes:
+        """Return the reply to a request frame, None to stay silent"""
+        if len(frame) < COMMAND_STATE_OFFSET or \
+                crc16_modbus(frame[:-2]) != (frame[-2] << 8) | frame[-1]:
+            _logger.debug('Port %d: invalid frame dropped', self.port)
+            return None
+        self.requests += 1
+        query = frame[QUERY_OFFSET]
+        if query == Query.TYPE_COMMAND:
+            end = COMMAND_STATE_OFFSET + STATE_SIZE
+            if len(frame) < end + 2:
+                return None
+            self.state[:] = frame[COMMAND_STATE_OFFSET:end]
+            self.commands += 1
+        elif query != Query.TYPE_GET_INFO:
+            return None
+        return self.reply(query)
+
+    def delay(self) -> float:
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+
+class _UnitProtocol(asyncio.Protocol):
+    def __init__(self, unit: VirtualUnit) -> None:
+        self.unit = unit
+        self.decoder = FrameDecoder()
+        self.transport = None
+        self.loop = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def data_received(self, data):
+        decoder = self.decoder
+        decoder.feed(data)
+        while True:
+            frame = decoder.next_frame()
+            if frame is None:
+                return
+            reply = self.unit.handle(frame)
+            if reply is None:
+                continue
+            delay = self.unit.delay()
+            if delay > 0:
+                self.loop.call_later(delay, self._write, reply)
+            else:
+                self._write(reply)
+
+    def _write(self, reply: bytes):
+        if not self.transport.is_closing():
+            self.transport.write(reply)
+
+
+class Simulator:
+    """Group of virtual units served by one event loop
+
+    Args:
+        host (str, optional): Address to bind
+        port (int, optional): Port of the first unit, the others follow.
+            0 gives every unit a free port
+        count (int, optional): Number of units
+        **unit_options: Passed to every VirtualUnit
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, count: int = 1,
+                 **unit_options) -> None:
+        self.host = host
+        self.units = [
+            VirtualUnit(port + index if port else 0, **unit_options)
+            for index in range(count)
+        ]
+        self._loop = None
+        self._thread = None
+
+    @property
+    def addresses(self) -> list:
+        return [(self.host, unit.port) for unit in self.units]
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for unit in self.units:
+            unit.server = await loop.create_server(
+                lambda unit=unit: _UnitProtocol(unit), self.host, unit.port,
+                reuse_address=True,
+            )
+            unit.port = unit.server.sockets[0].getsockname()[1]
+        _logger.info('%d units listening on %s', len(self.units), self.host)
+        return self
+
+    async def close(self):
+        for unit in self.units:
+            if unit.server is not None:
+                unit.server.close()
+                await unit.server.wait_closed()
+                unit.server = None
+
+    def start_in_thread(self):
+        """Serve the units from a daemon thread, for blocking callers"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='skyworth-simulator', daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), self._loop).result()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+
+def _raise_file_limit(count: int):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = count * 2 + 64
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate Skyworth units')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1998,
+                        help='port of the first unit')
+    parser.add_argument('--count', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='reply delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random +/- seconds added to the delay')
+    parser.add_argument('--temperature', type=int, default=24,
+                        help='reported inner temperature')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    _raise_file_limit(args.count)
+    simulator = Simulator(
+        args.host, args.port, args.count,
+        inner_temperature=args.temperature,
+        latency=args.latency,
+        jitter=args.jitter,
+    )
+
+    async def serve():
+        await simulator.start()
+        _logger.info(
+            'Ports %d-%d', simulator.units[0].port, simulator.units[-1].port
+        )
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
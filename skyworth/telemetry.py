@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Periodic sampling of units into memory-mapped columnar files
+
+One file per device. The file grows one chunk of `chunk_rows` rows at a
+time and every chunk stores its columns back to back:
+
+    header  64 bytes: magic, version, chunk_rows, committed row count
+    chunk   timestamp (int64 ns) * chunk_rows
+            inner_temperature (uint8) * chunk_rows
+            inner_temperature_float (uint8) * chunk_rows
+            state (d1..d10, 10 bytes) * chunk_rows
+    chunk   ...
+
+Appends write the 20 bytes of a row in place. A sync flushes the rows
+first and only then the row count of the header, readers only trust that
+count: a crash loses the rows appended since the last sync but never
+exposes a partial row. A sync writes at most five dirty pages whatever
+the number of rows it commits.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from .ac_async import run_sync
+from .fleet import AirConditionerFleet
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b'SKYTLM\x00\x01'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQ')
+HEADER_SIZE = 64
+COUNT_OFFSET = 16
+
+STATE_SIZE = 10
+# Name, array typecode (None for raw bytes) and size of the columns, in
+# chunk order
+COLUMNS = (
+    ('timestamp', 'q', 8),
+    ('inner_temperature', 'B', 1),
+    ('inner_temperature_float', 'B', 1),
+    ('state', None, STATE_SIZE),
+)
+ROW_SIZE = sum(size for _, _, size in COLUMNS)
+
+# One day of 10 second samples
+CHUNK_ROWS = 8640
+
+
+class TelemetryStore:
+    """Append-only columnar samples of one device
+
+    Args:
+        path (str): File of the store, created if missing
+        chunk_rows (int, optional): Rows per chunk of a new file
+        sync_every (int, optional): Commit to disk every `sync_every`
+            appends (one minute of 10 second samples by default), 0
+            commits rows immediately and leaves writing back to the OS
+    """
+
+    def __init__(self, path: str, chunk_rows: int = CHUNK_ROWS,
+                 sync_every: int = 6) -> None:
+        self.path = path
+        self.sync_every = sync_every
+        self._unsynced = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        size = os.fstat(fd).st_size
+        if size < HEADER_SIZE:
+            header = HEADER.pack(MAGIC, VERSION, chunk_rows, 0)
+            self._file.write(header.ljust(HEADER_SIZE, b'\x00'))
+            self._file.flush()
+            size = HEADER_SIZE
+        self._map = mmap.mmap(fd, size)
+        magic, version, self.chunk_rows, self.count = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            self._file.close()
+            raise ValueError('%s is not a telemetry store' % path)
+        # Byte offset of every column inside a chunk
+        self._offsets = {}
+        offset = 0
+        for name, typecode, size in COLUMNS:
+            self._offsets[name] = (offset, typecode, size)
+            offset += size * self.chunk_rows
+        self._chunk_size = offset
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def chunks(self) -> int:
+        return (len(self._map) - HEADER_SIZE) // self._chunk_size
+
+    def _grow(self):
+        # A whole chunk at a time, remapping is rare
+        size = len(self._map) + self._chunk_size
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def _position(self, name: str, row: int) -> int:
+        chunk, index = divmod(row, self.chunk_rows)
+        offset, _, size = self._offsets[name]
+        return HEADER_SIZE + chunk * self._chunk_size + offset + index * size
+
+    def append(self, timestamp: int, inner_temperature: int,
+               inner_temperature_float: int, state):
+        """Append one row, state holds the 10 bytes d1..d10"""
+        row = self.count
+        if row >= self.chunks * self.chunk_rows:
+            self._grow()
+        buffer = self._map
+        struct.pack_into('<q', buffer, self._position('timestamp', row), timestamp)
+        buffer[self._position('inner_temperature', row)] = inner_temperature
+        buffer[self._position('inner_temperature_float', row)] = \
+            inner_temperature_float
+        start = self._position('state', row)
+        buffer[start:start + STATE_SIZE] = bytes(state)
+        self.count = row + 1
+        if not self.sync_every:
+            self._commit()
+            return
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def _commit(self):
+        struct.pack_into('<Q', self._map, COUNT_OFFSET, self.count)
+
+    def sync(self):
+        """Write the appended rows to disk, then commit their count"""
+        self._map.flush()
+        self._commit()
+        self._map.flush(0, min(len(self._map), mmap.PAGESIZE))
+        self._unsynced = 0
+
+    def column(self, name: str, start: int = 0, stop: int = None):
+        """Values of a column for rows [start, stop)
+
+        Returns:
+            array: Typed values, bytes of 10 bytes per row for `state`
+        """
+        if stop is None or stop > self.count:
+            stop = self.count
+        _, typecode, size = self._offsets[name]
+        parts = []
+        row = start
+        while row < stop:
+            begin = self._position(name, row)
+            count = min(stop - row, self.chunk_rows - row % self.chunk_rows)
+            parts.append(self._map[begin:begin + count * size])
+            row += count
+        if typecode is None:
+            return b''.join(parts)
+        values = array(typecode)
+        for part in parts:
+            values.frombytes(part)
+        return values
+
+    def state(self, row: int) -> bytes:
+        """d1..d10 of a row"""
+        if not 0 <= row < self.count:
+            raise IndexError(row)
+        start = self._position('state', row)
+        return self._map[start:start + STATE_SIZE]
+
+    def columns(self, start: int = 0, stop: int = None) -> dict:
+        return {name: self.column(name, start, stop) for name, _, _ in COLUMNS}
+
+    def close(self):
+        if self._map is not None:
+            self.sync()
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def store_name(host: str, port: int) -> str:
+    return '%s_%d.tlm' % (host.replace(':', '_'), port)
+
+
+class TelemetryPoller:
+    """Sample every unit of a fleet on a fixed interval
+
+    Args:
+        fleet (AirConditionerFleet): Units to sample, hosts are accepted too
+        directory (str): Where the per-device stores live
+        interval (float, optional): Seconds between two samples
+        **store_options: Passed to every TelemetryStore
+    """
+
+    def __init__(self, fleet, directory: str, interval: float = 10.0,
+                 **store_options) -> None:
+        if not isinstance(fleet, AirConditionerFleet):
+            fleet = AirConditionerFleet(fleet)
+        self.fleet = fleet
+        self.directory = directory
+        self.interval = interval
+        self.store_options = store_options
+        self.stores = {}
+        self._stopped = False
+        os.makedirs(directory, exist_ok=True)
+
+    def store(self, address) -> TelemetryStore:
+        store = self.stores.get(address)
+        if store is None:
+            path = os.path.join(self.directory, store_name(*address))
+            store = self.stores[address] = TelemetryStore(path, **self.store_options)
+        return store
+
+    async def poll_once(self) -> dict:
+        """Sample every unit once, returns the FleetResult per address
+
+        The value of a result is the sample timestamp, None when the
+        reply did not confirm a state (bad CRC or address).
+        """
+        async def sample(model):
+            version = model.cache.version
+            await model.refresh(force=True)
+            # The cache is only touched by a state confirmed by the unit
+            if model.cache.version == version:
+                return None
+            return time.time_ns()
+
+        results = await self.fleet.async_map(sample)
+        for address, result in results.items():
+            if not result.ok or result.value is None:
+                continue
+            controller = self.fleet.models[address].controller
+            if controller.inner_temperature is None:
+                continue
+            self.store(address).append(
+                result.value,
+                controller.inner_temperature,
+                controller.inner_temperature_float,
+                controller.data.payload[2:],
+            )
+        return results
+
+    async def run(self, samples: int = None):
+        """Poll until stop() or `samples` rounds, on a drift-free schedule"""
+        loop = asyncio.get_running_loop()
+        self._stopped = False
+        deadline = loop.time()
+        done = 0
+        while not self._stopped and (samples is None or done < samples):
+            await self.poll_once()
+            done += 1
+            deadline += self.interval
+            delay = deadline - loop.time()
+            if delay < 0:
+                # Late, skip the missed rounds instead of bursting
+                _logger.warning('Telemetry round late by %.3fs', -delay)
+                deadline = loop.time()
+                delay = 0
+            if samples is None or done < samples:
+                await asyncio.sleep(delay)
+
+    def stop(self):
+        self._stopped = True
+
+    async def async_close(self):
+        await self.fleet.async_close()
+        for store in self.stores.values():
+            store.close()
+        self.stores.clear()
+
+    def run_sync(self, samples: int = None):
+        run_sync(self.run(samples))
+
+    def close(self):
+        run_sync(self.async_close())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Phase-level latency of the controller exchanges
+
+A timed operation fills a dict of phase -> nanoseconds (monotonic clock):
+
+    encode      frame building (and CRC) on the Python side
+    connect     TCP connect, only when a new connection was opened
+    send        handing the frame to the socket
+    recv        from the sent frame to the complete reply (unit time)
+    exchange    whole transport exchange, connect + send + recv
+    decode      reply parsing (CRC check and state update)
+    total       the whole operation
+
+Transports that cannot split an exchange (ReplayTransport) only report
+`exchange`. Finished operations are handed to a sink, a callable
+sink(address, operation, phases):
+
+    controller.enable_timing()          # RingBufferSink
+    ...
+    controller.latency_summary()        # {'recv': {'p50': ..., ...}, ...}
+"""
+
+import logging
+import math
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+PHASES = ('encode', 'connect', 'send', 'recv', 'exchange', 'decode', 'total')
+
+PERCENTILES = (50, 90, 99)
+
+
+def add_phase(phases: dict, name: str, start: int) -> int:
+    """Add the time elapsed since start to a phase, returns now"""
+    now = time.monotonic_ns()
+    phases[name] = phases.get(name, 0) + now - start
+    return now
+
+
+def percentile(values: list, q: float):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class PhaseRecord:
+    __slots__ = ('timestamp', 'address', 'operation', 'phases')
+
+    def __init__(self, timestamp: int, address, operation: str,
+                 phases: dict) -> None:
+        self.timestamp = timestamp
+        self.address = address
+        self.operation = operation
+        self.phases = phases
+
+    def __repr__(self) -> str:
+        return 'PhaseRecord(%s:%d, %s, %s)' % (
+            *self.address, self.operation, ', '.join(
+                '%s=%d' % (name, self.phases[name])
+                for name in PHASES if name in self.phases
+            )
+        )
+
+
+class RingBufferSink:
+    """Keep the last `capacity` timed operations in memory
+
+    Args:
+        capacity (int, optional): Records kept, older ones are overwritten
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.capacity = capacity
+        self._records = [None] * capacity
+        self._next = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def __call__(self, address, operation: str, phases: dict):
+        record = PhaseRecord(time.monotonic_ns(), address, operation, phases)
+        with self._lock:
+            self._records[self._next] = record
+            self._next = (self._next + 1) % self.capacity
+            self.count += 1
+
+    def records(self, operation: str = None) -> list:
+        """Kept records, oldest first"""
+        with self._lock:
+            if self.count < self.capacity:
+                records = self._records[:self.count]
+            else:
+                records = self._records[self._next:] + self._records[:self._next]
+        if operation is not None:
+            records = [record for record in records if record.operation == operation]
+        return records
+
+    def summary(self, percentiles=PERCENTILES, operation: str = None) -> dict:
+        """Percentiles in nanoseconds of every phase seen
+
+        Returns:
+            dict: phase -> {'count': n, 'p50': ns, ...}
+        """
+        values = {}
+        for record in self.records(operation):
+            for name, value in record.phases.items():
+                values.setdefault(name, []).append(value)
+        summary = {}
+        for name in PHASES:
+            if name not in values:
+                continue
+            phase = sorted(values[name])
+            summary[name] = {'count': len(phase)}
+            for q in percentiles:
+                summary[name]['p%g' % q] = percentile(phase, q)
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._records = [None] * self.capacity
+            self._next = 0
+            self.count = 0
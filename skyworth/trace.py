@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+from .convert import (
+    barray2hexlist,
+    barray2sblist,
+)
+
+# Attached sinks, frames are only handed out while this list is not empty
+SINKS = []
+
+SEND = '>>'
+RECEIVE = '<<'
+
+
+def add_sink(sink):
+    """Attach a callable sink(direction, address, frame)
+
+    `frame` is only valid during the call, copy it to keep it.
+    """
+    if sink not in SINKS:
+        SINKS.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in SINKS:
+        SINKS.remove(sink)
+
+
+def trace_frame(direction: str, address, frame):
+    for sink in SINKS:
+        sink(direction, address, frame)
+
+
+class LoggingSink:
+    """Render frames as hex and signed byte lists on a logger"""
+
+    def __init__(self, logger: logging.Logger, level: int = logging.DEBUG) -> None:
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, direction: str, address, frame):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "data %s %s", direction, barray2hexlist(frame))
+            self.logger.log(self.level, "data %s %s", direction, barray2sblist(frame))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+from skyworth.ac_controller import Query
+from skyworth.crc import crc16_modbus
+from skyworth.framing import HEADER, MAX_FRAME_LENGTH, FrameDecoder
+from skyworth.simulator import VirtualUnit
+
+UNIT = VirtualUnit()
+REPLIES = [UNIT.reply(Query.TYPE_COMMAND), UNIT.reply(Query.TYPE_GET_INFO)]
+
+
+def _frame(length: int) -> bytes:
+    body = HEADER + bytes((0, 1, length)) + bytes(length - 7)
+    crc = crc16_modbus(body)
+    return body + bytes((crc >> 8, crc & 0xff))
+
+
+def _noise(rng: random.Random) -> bytearray:
+    noise = bytearray(rng.randrange(256) for _ in range(rng.randrange(12)))
+    if rng.random() < 0.5:
+        # A fake header with a random LENGTH
+        position = rng.randrange(len(noise) + 1)
+        noise[position:position] = HEADER + bytes(
+            rng.randrange(256) for _ in range(3)
+        )
+    return noise
+
+
+def test_frames_split_across_feeds():
+    decoder = FrameDecoder()
+    stream = b''.join(REPLIES)
+    frames = []
+    for index in range(len(stream)):
+        decoder.feed(stream[index:index + 1])
+        frames += [bytes(frame) for frame in decoder.frames()]
+    assert frames == REPLIES
+
+
+def test_resync_after_noise():
+    rng = random.Random(1)
+    for _ in range(2000):
+        decoder = FrameDecoder()
+        stream = bytearray()
+        expected = []
+        for _ in range(4):
+            reply = rng.choice(REPLIES)
+            stream += _noise(rng) + reply
+            expected.append(reply)
+        frames = []
+        index = 0
+        while index < len(stream):
+            size = rng.randrange(1, 30)
+            decoder.feed(stream[index:index + size])
+            index += size
+            frames += [bytes(frame) for frame in decoder.frames()]
+        assert [frame for frame in frames if frame in REPLIES] == expected
+
+
+def test_corrupted_frame_is_yielded():
+    # Without another header inside, the CRC is left to the parser
+    frame = bytearray(REPLIES[1])
+    frame[15] ^= 1
+    decoder = FrameDecoder()
+    decoder.feed(frame)
+    assert bytes(decoder.next_frame()) == frame
+
+
+def test_max_length():
+    frame = _frame(MAX_FRAME_LENGTH + 5)
+    decoder = FrameDecoder()
+    decoder.feed(frame)
+    assert decoder.next_frame() is None
+
+    decoder = FrameDecoder(max_length=MAX_FRAME_LENGTH + 5)
+    decoder.feed(frame)
+    assert bytes(decoder.next_frame()) == frame
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from skyworth.ac_controller import AirConditionerController, Mode
+from skyworth.ac_model import AirConditionerModel, ModeAction
+
+
+MODES = {
+    ModeAction.AUTO: Mode.AUTO,
+    ModeAction.COOL: Mode.COOL,
+    ModeAction.HEAT: Mode.HEAT,
+    ModeAction.DEHUMIDIFIER: Mode.DEHUMIDIFIER,
+    ModeAction.FAN: Mode.FAN,
+}
+
+
+class NullTransport:
+    def exchange(self, address, message, phases=None):
+        return b''
+
+
+def _model() -> AirConditionerModel:
+    return AirConditionerModel(
+        AirConditionerController('127.0.0.1', transport=NullTransport())
+    )
+
+
+def _reference_apply_mode(model: AirConditionerModel, action: ModeAction):
+    """Mode transition as applied field by field before the mode plans"""
+    controller = model.controller
+    controller._set_power(True)
+    if action not in MODES:
+        raise Exception("Unknown ModeAction")
+    if action == ModeAction.AUTO:
+        controller._set_turbo(False)
+    controller._set_mode(MODES[action])
+    if action == ModeAction.DEHUMIDIFIER:
+        controller._set_turbo(False)
+        controller._set_fan_speed(1)
+    else:
+        model._restore_fan_speed()
+    model._restore_temperature_set()
+    controller._set_mute(False)
+    model._restore_swing_state()
+    controller._set_auxiliary_heating(action == ModeAction.HEAT)
+    controller._set_sleep(False)
+    controller._set_energy_saving(False)
+
+
+def _outcome(function, *args):
+    try:
+        function(*args)
+    except Exception as error:
+        return type(error)
+    return None
+
+
+def _randomize_saved_states(rng: random.Random, models: list):
+    for action in ModeAction:
+        swing = rng.choice([None, rng.randrange(256)])
+        speed = rng.choice([None, rng.randrange(7)])
+        temperature = rng.choice([None, 9, rng.randrange(10, 40)])
+        for model in models:
+            model._swing_state[action] = swing
+            model._fan_speed[action] = speed
+            model._temperature_set[action] = temperature
+            model._mode_plans.clear()
+
+
+def test_mode_plan_matches_reference():
+    rng = random.Random(1)
+    model, reference = _model(), _model()
+    for _ in range(5000):
+        state = bytes(rng.randrange(256) for _ in range(12))
+        model.controller.data.restore(state)
+        reference.controller.data.restore(state)
+        _randomize_saved_states(rng, [model, reference])
+        action = rng.choice(list(ModeAction))
+        # Fahrenheit temperatures are not implemented, both must fail alike
+        assert _outcome(model._apply_mode, action) == \
+            _outcome(_reference_apply_mode, reference, action)
+        assert model.controller.data.snapshot() == \
+            reference.controller.data.snapshot(), (state.hex(), action)
+
+
+def test_mode_plan_reused_until_saved_again():
+    model = _model()
+    model.controller.data.restore(bytes(12))
+    model._apply_mode(ModeAction.COOL)
+    plan = model._mode_plans[ModeAction.COOL]
+    model._apply_mode(ModeAction.HEAT)
+    model._apply_mode(ModeAction.COOL)
+    assert model._mode_plans[ModeAction.COOL] is plan
+
+    model._apply_speed(3)
+    assert ModeAction.COOL not in model._mode_plans
+    model._apply_mode(ModeAction.HEAT)
+    model._apply_mode(ModeAction.COOL)
+    assert model.controller._get_fan_speed() == 3
+
+    model._apply_temperature_set(25)
+    model._apply_mode(ModeAction.FAN)
+    model._apply_mode(ModeAction.COOL)
+    assert model.controller._get_temperature_set() == 25
+
+
+def test_unknown_mode_action():
+    with pytest.raises(Exception, match='Unknown ModeAction'):
+        _model()._apply_mode(7)
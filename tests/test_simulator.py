@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Round trips against skyworth.simulator, no unit needed"""
+
+import pytest
+
+from skyworth.ac_async import (
+    AsyncAirConditionerController,
+    AsyncAirConditionerModel,
+    run_sync,
+)
+from skyworth.ac_controller import AirConditionerController
+from skyworth.ac_model import AirConditionerModel, ControlAction, ModeAction
+from skyworth.connection import ConnectionPool
+from skyworth.simulator import Simulator, VirtualUnit
+
+
+@pytest.fixture
+def simulator():
+    simulator = Simulator(count=2).start_in_thread()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool()
+    yield pool
+    pool.close()
+
+
+class UnitTransport:
+    """Answer from a VirtualUnit, optionally corrupting the reply CRC"""
+
+    def __init__(self, unit: VirtualUnit) -> None:
+        self.unit = unit
+        self.corrupt = False
+
+    def exchange(self, address, message, phases=None):
+        reply = bytearray(self.unit.handle(bytes(message)))
+        if self.corrupt:
+            reply[-1] ^= 0xff
+        return bytes(reply)
+
+
+def test_sync_round_trip(simulator, pool):
+    host, port = simulator.addresses[0]
+    unit = simulator.units[0]
+    model = AirConditionerModel(AirConditionerController(host, port, pool))
+    model.update_state()
+    assert model.power == ControlAction.OFF
+    assert model.controller.inner_temperature == unit.inner_temperature
+
+    with model.batch():
+        model.power_on()
+        model.mode = ModeAction.COOL
+        model.temperature_set = 22
+    assert unit.commands == 1
+    assert not model.controller.data.is_dirty()
+
+    other = AirConditionerModel(AirConditionerController(host, port, pool))
+    other.update_state()
+    assert other.power == ControlAction.ON
+    assert other.mode == ModeAction.COOL
+    assert other.temperature_set == 22
+    assert pool.stats((host, port)).reuses > 0
+
+
+def test_async_round_trip(simulator):
+    host, port = simulator.addresses[1]
+    unit = simulator.units[1]
+
+    async def scenario():
+        controller = AsyncAirConditionerController(host, port)
+        model = AsyncAirConditionerModel(controller)
+        try:
+            await model.update_state()
+            async with model.batch():
+                await model.set_power(ControlAction.ON)
+                await model.set_mode(ModeAction.HEAT)
+                await model.set_temperature_set(26)
+            await model.refresh(force=True)
+            return model.power, model.mode, model.temperature_set
+        finally:
+            await controller.close()
+
+    assert run_sync(scenario()) == (ControlAction.ON, ModeAction.HEAT, 26)
+    assert unit.commands == 1
+
+
+def test_corrupted_command_echo_is_not_confirmed():
+    unit = VirtualUnit()
+    transport = UnitTransport(unit)
+    model = AirConditionerModel(AirConditionerController('127.0.0.1',
+                                                         transport=transport))
+    model.update_state()
+    version = model.cache.version
+
+    transport.corrupt = True
+    model.power_on()
+    assert model.controller.data.is_dirty()
+    assert model.cache.version == version
+
+    # The unit applied the command, the next write reads it back
+    transport.corrupt = False
+    model.power_on()
+    assert not model.controller.data.is_dirty()
+    assert model.cache.version != version
+    assert model.power == ControlAction.ON
+
+
+def test_short_reply_is_rejected():
+    unit = VirtualUnit()
+    controller = AirConditionerController('127.0.0.1',
+                                          transport=UnitTransport(unit))
+    reply = unit.reply(0xa2)
+    assert not controller._parse_info(reply[:12] + reply[-2:])